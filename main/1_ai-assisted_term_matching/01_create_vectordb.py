@@ -5,10 +5,15 @@ from langchain_chroma import Chroma
 #from langchain_graph_retriever.transformers import ShreddingTransformer
 from dotenv import load_dotenv
 
+import hashlib
 import json
-from uuid import uuid4
+from uuid import NAMESPACE_URL, uuid5
 from pathlib import Path
 
+from embedding_cache import CachedEmbeddings
+from mapping_utils import parse_page_content
+from numpy_vector_store import NumpyVectorStore
+
 load_dotenv()
 ### In the root directory of your project, create a file named .env and add your environment variables in a KEY=VALUE format.
 # Example:
@@ -18,31 +23,48 @@ INPUT_FILE_NAME = "terms_edited.jsonl"
 OUTPUT_FILE_NAME = "terms_demo.jsonl"
 COLLECTION_NAME = "glycan_structure_dictionary" # Vector store collection name
 EMBEDDING_MODEL = "text-embedding-3-small"
+VECTOR_BACKEND = "chroma" # "chroma" or "numpy" (memory-mapped .npy matrix + sidecar metadata, exact cosine search)
+SYNC_MODE = True # Upsert new/changed documents and delete removed ones instead of rebuilding the collection
+BATCH_SIZE = 500 # Documents per upsert/delete call in sync mode
 
 src_dir = Path(__file__).parents[2]
 input_file = src_dir / "data/raw/src_gsdv0/archive" / INPUT_FILE_NAME
 persist_dir = src_dir / "data/vector_store"
+embedding_cache_file = src_dir / "data/cache" / "embedding_cache.sqlite"
 
-embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+vector_store_class = NumpyVectorStore if VECTOR_BACKEND == "numpy" else Chroma
+embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL), embedding_cache_file)
 
 # Convert JSON entries to Document objects
-documents = []
+documents = {}
 with open(input_file, 'r', encoding='utf-8') as f:
     for line in f:
         entry = json.loads(line)
 
         # Create page_content by combining term, description, and synonyms
-        term = entry.get("sub_term", "")
-        exact_synonyms = entry.get("exact_synonyms", "")
+        term = entry.get("normalized_term", "")
+        if not term:
+            print(f"[WARNING] Skipping entry without normalized_term: {line.strip()[:100]}")
+            continue
+        exact_synonyms = entry.get("synonyms") or []
+        if not isinstance(exact_synonyms, list):
+            exact_synonyms = [exact_synonyms]
         description = entry.get("description", "")
-        term_uuid = entry.get("term_id", str(uuid4()))
+        # Deterministic fallback id (from gsd_id, else the whole line), so re-runs recognise the same entry instead of adding a duplicate
+        term_uuid = entry.get("term_uuid") or str(uuid5(NAMESPACE_URL, f"{INPUT_FILE_NAME}:{entry.get('gsd_id') or line.strip()}"))
 
         page_content = f"Term: {term}\nExact Synonyms: {exact_synonyms}\nDescription: {description}\nTerm UUID: {term_uuid}"
 
         # Combine content and metadata for document metadata
+        # source_file/content_hash let sync mode tell curated documents it owns from documents the agents added;
+        # source_synonyms tells curated synonyms from synonyms the agents appended later
         doc_metadata = {
             "term": term,
             "term_uuid": term_uuid,
+            "source_file": INPUT_FILE_NAME,
+            "content_hash": hashlib.sha256(page_content.encode("utf-8")).hexdigest(),
+            "exact_synonyms": json.dumps(exact_synonyms, ensure_ascii=False),
+            "source_synonyms": json.dumps(exact_synonyms, ensure_ascii=False),
         }
     
         # Create document
@@ -51,23 +73,126 @@ with open(input_file, 'r', encoding='utf-8') as f:
             metadata=doc_metadata,
             id=term_uuid
         )
-        documents.append(doc)
+        if term_uuid in documents:
+            print(f"[WARNING] Duplicate term UUID {term_uuid} ({term}); keeping the last entry")
+        documents[term_uuid] = doc
 
 print(f"Created {len(documents)} documents")
 
+
+def update_metadatas(vector_store, ids, metadatas) -> None:
+    """Rewrites document metadata only; page_content and embeddings are left as they are."""
+    if isinstance(vector_store, NumpyVectorStore):
+        vector_store.update_metadatas(ids, metadatas)
+    else:
+        vector_store._collection.update(ids=ids, metadatas=metadatas)
+
+
+def matches_curated_content(doc, existing_content) -> bool:
+    """True if a document of an earlier build (no content_hash) holds the same content as doc.
+    Synonyms the agents appended after the curated ones are ignored, so only the curated base text is compared."""
+    curated = json.loads(doc.metadata["source_synonyms"])
+    _, existing_synonyms = parse_page_content(existing_content)
+    if existing_synonyms[:len(curated)] != curated:
+        return False
+    lines = existing_content.split("\n")
+    if len(lines) > 1 and lines[1].startswith("Exact Synonyms:"):
+        lines[1] = f"Exact Synonyms: {curated}"
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest() == doc.metadata["content_hash"]
+
+
+def with_agent_synonyms(doc, existing_content, existing_metadata) -> Document:
+    """Carries the synonyms the mapping agents appended to the existing document over to its edited version."""
+    _, existing_synonyms = parse_page_content(existing_content)
+    if "exact_synonyms" in existing_metadata:
+        existing_synonyms = json.loads(existing_metadata["exact_synonyms"])
+    curated_before = json.loads(existing_metadata.get("source_synonyms", "[]"))
+    synonyms = json.loads(doc.metadata["exact_synonyms"])
+    agent_synonyms = [
+        synonym for synonym in existing_synonyms
+        if synonym not in curated_before and synonym not in synonyms and synonym != doc.metadata["term"]
+    ]
+    if not agent_synonyms:
+        return doc
+    synonyms += agent_synonyms
+    lines = doc.page_content.split("\n")
+    lines[1] = f"Exact Synonyms: {synonyms}"
+    metadata = dict(doc.metadata, exact_synonyms=json.dumps(synonyms, ensure_ascii=False))
+    return Document(page_content="\n".join(lines), metadata=metadata, id=doc.id)
+
+
+def sync_vector_store(vector_store, documents) -> None:
+    """Diffs the input against the collection by term UUID and content hash.
+    Upserts new or changed documents and deletes documents previously synced from INPUT_FILE_NAME that are no longer in it.
+    Documents added by the mapping agents (no source_file) are left untouched; a curated document the agents
+    updated (synonyms appended) keeps its input content hash, so it is only rewritten when the curator edits the entry,
+    and then keeps the appended synonyms. Documents of earlier builds (no content_hash) whose curated content
+    matches the input are adopted by stamping their metadata, without rewriting or re-embedding them; stale ones
+    are treated as changed."""
+    existing = vector_store.get(include=["documents", "metadatas"])
+    existing_docs = {}
+    owned_ids = set()
+    for doc_id, page_content, metadata in zip(existing["ids"], existing["documents"], existing["metadatas"]):
+        metadata = metadata or {}
+        existing_docs[doc_id] = (page_content, metadata)
+        if metadata.get("source_file") == INPUT_FILE_NAME:
+            owned_ids.add(doc_id)
+
+    new_docs, changed_docs, adopted = [], [], {}
+    for doc_id, doc in documents.items():
+        if doc_id not in existing_docs:
+            new_docs.append(doc)
+            continue
+        page_content, metadata = existing_docs[doc_id]
+        if "content_hash" not in metadata and matches_curated_content(doc, page_content):
+            adopted[doc_id] = dict(
+                metadata,
+                source_file=INPUT_FILE_NAME,
+                content_hash=doc.metadata["content_hash"],
+                source_synonyms=doc.metadata["source_synonyms"],
+            )
+        elif metadata.get("content_hash") != doc.metadata["content_hash"]:
+            changed_docs.append(with_agent_synonyms(doc, page_content, metadata))
+    removed_ids = sorted(owned_ids - set(documents))
+    print(f"Sync: {len(new_docs)} new, {len(changed_docs)} changed, {len(adopted)} adopted, {len(removed_ids)} removed, "
+          f"{len(documents) - len(new_docs) - len(changed_docs) - len(adopted)} unchanged")
+
+    upserts = new_docs + changed_docs
+    for i in range(0, len(upserts), BATCH_SIZE):
+        batch = upserts[i:i + BATCH_SIZE]
+        vector_store.add_documents(documents=batch, ids=[doc.id for doc in batch]) # Chroma upserts by id
+    adopted_ids = list(adopted)
+    for i in range(0, len(adopted_ids), BATCH_SIZE):
+        batch = adopted_ids[i:i + BATCH_SIZE]
+        update_metadatas(vector_store, batch, [adopted[doc_id] for doc_id in batch])
+    for i in range(0, len(removed_ids), BATCH_SIZE):
+        vector_store.delete(ids=removed_ids[i:i + BATCH_SIZE])
+
+
 # Create vector store
 #shredder = ShreddingTransformer()
 try:
-    vector_store = Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        COLLECTION_NAME=COLLECTION_NAME,
-        persist_directory=persist_dir,
-        collection_metadata ={"hnsw:space": "cosine"}
-    )
-    print(f"Successfully created vector database with {len(documents)} documents")
+    if SYNC_MODE:
+        vector_store = vector_store_class(
+            collection_name=COLLECTION_NAME,
+            embedding_function=embeddings,
+            persist_directory=str(persist_dir),
+            collection_metadata={"hnsw:space": "cosine"}
+        )
+        sync_vector_store(vector_store, documents)
+        print(f"Successfully synced vector database with {len(documents)} documents")
+    else:
+        vector_store = vector_store_class.from_documents(
+            documents=list(documents.values()),
+            embedding=embeddings,
+            collection_name=COLLECTION_NAME,
+            persist_directory=str(persist_dir),
+            collection_metadata ={"hnsw:space": "cosine"}
+        )
+        print(f"Successfully created vector database with {len(documents)} documents")
+    print(f"Embedding cache: {embeddings.hits} hits, {embeddings.misses} misses")
     print(f"Database saved to: {persist_dir}")
-    print(f"Collection name: {COLLECTION_NAME}")
+    print(f"Collection name: {COLLECTION_NAME} ({VECTOR_BACKEND} backend)")
     
     # Test retrieval
     print("\n--- Testing retrieval ---")
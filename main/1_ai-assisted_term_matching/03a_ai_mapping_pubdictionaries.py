@@ -8,36 +8,76 @@ from langchain_core.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
 from uuid import uuid4
 from pathlib import Path
-import ast
 import json
+import threading
 
 from llm_prompts import MAPPING_PROMPT
+from embedding_cache import CachedEmbeddings
+from numpy_vector_store import NumpyVectorStore
+from mapping_utils import OrderedDecisionWriter, load_checkpoint, run_mapping
+from mapping_utils import claim_recovered_add, delete_unclaimed_adds
+from mapping_utils import DecisionCache, replay_tool_calls, tool_calls_from_steps
+from mapping_utils import BatchRetriever, LexicalIndex, SynonymBuffer
 
 load_dotenv()
 
 INPUT_FILE_NAME = "terms_edited.jsonl"
 OUTPUT_FILE_NAME = "terms_ai-decisions_demo.jsonl"
+CHECKPOINT_FILE_NAME = "terms_ai-decisions_demo.checkpoint.jsonl"
 COLLECTION_NAME = "glycan_structure_dictionary"
 EMBEDDING_MODEL = "text-embedding-3-small"
+VECTOR_BACKEND = "chroma" # "chroma" or "numpy" (memory-mapped .npy matrix + sidecar metadata, exact cosine search)
 LARGE_LANGUAGE_MODEL = "gpt-4.1"
 LOG_FILE_NAME = "ai_mapping_demo.log"
+MAX_WORKERS = 4 # Number of terms mapped concurrently; 1 reproduces the sequential run
+RESUME = True # Skip lines/terms already decided by a previous (interrupted) run
+DECISION_CACHE = True # Replay cached decisions for unchanged term + candidates + prompt instead of calling the LLM
+LEXICAL_SHORT_CIRCUIT = True # Map unambiguous exact (or separator-only variant) label/synonym matches directly, without the LLM
+BATCH_RETRIEVAL = True # Embed all input terms in bulk and score them against the collection in one pass
+SYNONYM_FLUSH_SIZE = 100 # Documents with new synonyms buffered before they are re-embedded and written in one batch
 
 src_dir = Path(__file__).parents[2]
 input_file = src_dir / "data/raw/src_pubdictionaries/archive" / INPUT_FILE_NAME
 output_file = src_dir / "data/raw/src_pubdictionaries/archive" / OUTPUT_FILE_NAME
+checkpoint_file = src_dir / "data/raw/src_pubdictionaries/archive" / CHECKPOINT_FILE_NAME
 log_file = src_dir / "data/raw/src_pubdictionaries" / LOG_FILE_NAME
 persist_dir = src_dir / "data/vector_store"
+embedding_cache_file = src_dir / "data/cache" / "embedding_cache.sqlite"
+cache_file = src_dir / "data/cache" / "llm_decision_cache.sqlite"
 
-embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
-vector_store = Chroma(
+embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL), embedding_cache_file)
+vector_store_class = NumpyVectorStore if VECTOR_BACKEND == "numpy" else Chroma
+vector_store = vector_store_class(
     persist_directory=persist_dir,
     collection_name=COLLECTION_NAME,
     embedding_function=embeddings
 )
-print("Loaded existing Chroma vector store...")
+print(f"Loaded existing {VECTOR_BACKEND} vector store...")
+
+# Vector store writes are serialized; added_terms lets a worker reuse a concept another worker just added
+store_lock = threading.Lock()
+added_terms = {}
+decision_writer = OrderedDecisionWriter(output_file, log_file, checkpoint_file)
+lexical_index = LexicalIndex.from_vector_store(vector_store) if LEXICAL_SHORT_CIRCUIT else None
+retriever = BatchRetriever(vector_store, embeddings, k=5, score_threshold=0.3) if BATCH_RETRIEVAL else None
+synonym_buffer = SynonymBuffer(vector_store, SYNONYM_FLUSH_SIZE, on_flush=retriever.refresh if retriever is not None else None, writer=decision_writer)
+
+# Lines/terms finished by a previous run are skipped; documents added by an unfinished line are reused
+if RESUME:
+    completed_lines, decided_terms, recovered_adds, journaled_updates = load_checkpoint(checkpoint_file, output_file)
+    # Synonym updates of the previous run may still have been buffered when it stopped
+    synonym_buffer.replay(journaled_updates)
+else:
+    completed_lines, decided_terms, recovered_adds = set(), set(), {}
 
 
 def search_glycan_structure(query: str):
+    if retriever is not None:
+        retrieval_res = ""
+        for page_content, score in retriever.search(query):
+            retrieval_res += f"{page_content}\n\n"
+        return retrieval_res
+
     res = vector_store.similarity_search_with_relevance_scores(
         query=query,
         k=5,
@@ -60,24 +100,40 @@ def add_new_term(term_name: str) -> dict:
     
     ### VECTOR STORE HANDLING
     global vector_store
-    term_uuid = str(uuid4())
-
-    page_content = f"Term: {term_name}\nExact Synonyms: []\nDescription: \nTerm UUID: {term_uuid}"
-
-    document = Document(
-        page_content=page_content,
-        metadata={"term": term_name, "uuid": term_uuid},
-        id=term_uuid
-    )
-
-    vector_store.add_documents(ids = [term_uuid], documents = [document])
+    with store_lock:
+        # Another worker may have added the same concept while this one was waiting on the LLM
+        existing_uuid = added_terms.get(term_name.strip().lower())
+        if existing_uuid:
+            result = {"source_term": term_name, "mapped_to_uuid": existing_uuid, "action": "map"}
+            decision_writer.record(result)
+            return result
+
+        # Already added to the vector store for this input line by an interrupted run before its decision was written
+        term_uuid = claim_recovered_add(recovered_adds, term_name)
+        if term_uuid is None:
+            term_uuid = str(uuid4())
+
+            page_content = f"Term: {term_name}\nExact Synonyms: []\nDescription: \nTerm UUID: {term_uuid}"
+
+            document = Document(
+                page_content=page_content,
+                metadata={"term": term_name, "uuid": term_uuid, "exact_synonyms": "[]"},
+                id=term_uuid
+            )
+
+            vector_store.add_documents(ids = [term_uuid], documents = [document])
+            decision_writer.record_mutation("add", term_name, term_uuid)
+            if retriever is not None:
+                retriever.refresh(term_uuid)
+        added_terms[term_name.strip().lower()] = term_uuid
+        if lexical_index is not None:
+            lexical_index.add(term_name, term_uuid, "Term")
     
     ### MAPPING FILE HANDLING
     result = {"source_term": term_name, "mapped_to_uuid": term_uuid, "action": "add"}
     
-    # Write to output file
-    with open(output_file, 'a', encoding='utf-8') as outfile:
-        outfile.write(json.dumps(result, ensure_ascii=False) + "\n")
+    # Written to output file in input order
+    decision_writer.record(result)
     
     return result
 
@@ -92,43 +148,24 @@ def map_to_existing_term(term_name: str, term_uuid: str) -> dict:
     # VECTOR STORE HANDLING
     global vector_store
     
-    retrieved_doc = vector_store.get(ids=[term_uuid])
-    retrieved_meta = retrieved_doc['metadatas'][0]
-    retrieved_term = retrieved_doc["documents"][0].split("\n")[0].split("Term: ")[1]
-    retrieved_synonyms = retrieved_doc["documents"][0].split("\n")[1].split("Exact Synonyms: ")[1]
-    if retrieved_synonyms != "":
-        retrieved_synonyms = ast.literal_eval(retrieved_synonyms)
-    else:
-        retrieved_synonyms = []
-
-    if term_name not in retrieved_synonyms or term_name != retrieved_term:
-        if len(retrieved_synonyms) == 0:
-            updated_synonyms = [term_name]
-        else:
-            updated_synonyms = retrieved_synonyms + [term_name]
-        updated_content = retrieved_doc["documents"][0].replace(str(retrieved_synonyms), str(updated_synonyms))
-    else:
-        updated_content = retrieved_doc["documents"][0]
-
-    updated_doc = Document(
-        page_content=updated_content,
-        metadata=retrieved_meta,
-        id=term_uuid
-        )
-    
-    vector_store.update_document(document_id=updated_doc.id, document=updated_doc)
+    # Synonym updates must not interleave with other workers' store writes
+    with store_lock:
+        # Buffered and written to the store in batches; mapping the same synonym twice is a no-op
+        if synonym_buffer.add(term_uuid, term_name):
+            decision_writer.record_mutation("update", term_name, term_uuid)
+        if lexical_index is not None:
+            lexical_index.add(term_name, term_uuid, "Exact Synonyms")
     
     ### MAPPING FILE HANDLING
     result = {"source_term": term_name, "mapped_to_uuid": term_uuid, "action": "map"}
     
-    # Write to output file
-    with open(output_file, 'a', encoding='utf-8') as outfile:
-        outfile.write(json.dumps(result, ensure_ascii=False) + "\n")
+    # Written to output file in input order
+    decision_writer.record(result)
     
     return result
 
 tools = [add_new_term, map_to_existing_term]
-llm = ChatOpenAI(model="gpt-4.1", temperature=0)
+llm = ChatOpenAI(model=LARGE_LANGUAGE_MODEL, temperature=0)
 
 # Create the prompt template
 prompt = ChatPromptTemplate.from_messages(
@@ -141,11 +178,50 @@ prompt = ChatPromptTemplate.from_messages(
 
 
 agent = create_tool_calling_agent(llm, tools, prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, return_intermediate_steps=True)
+decision_cache = DecisionCache(cache_file, MAPPING_PROMPT, LARGE_LANGUAGE_MODEL) if DECISION_CACHE else None
+
+
+def map_term(term, synonyms):
+    # Unambiguous exact normalized match: map directly and skip retrieval and the LLM
+    if lexical_index is not None:
+        lexical_match = lexical_index.match(term)
+        if lexical_match is not None:
+            matched_uuid, reason = lexical_match
+            map_to_existing_term.invoke({"term_name": term, "term_uuid": matched_uuid})
+            return f"Processing term: {term}\n[LEXICAL] Mapped to {matched_uuid}: {reason}\n\n"
+
+    # Retrieval runs in the worker so it sees terms added by lines that finished earlier
+    retrieval_res = search_glycan_structure(term)
+    input_text = f"""
+        Candidate term: "{term}"
+        {synonyms}    
+        Potential matches in database:
+        {retrieval_res}
+        
+        Analyze the candidate term against potential matches and decide whether to map it to an existing term or add it as a new term.
+        """
 
+    # Same term, same candidates, same prompt/model -> replay the cached tool calls without an API round-trip
+    if decision_cache is not None:
+        cache_key = decision_cache.key(term, synonyms + retrieval_res)
+        cached = decision_cache.get(cache_key)
+        if cached is not None:
+            replay_tool_calls(cached["tool_calls"], cached["term"], term, tools)
+            return f"Processing term: {term}\n[CACHED] " + json.dumps(cached["output"], ensure_ascii=False) + "\n\n"
 
+    response = agent_executor.invoke({"input": input_text}) # Move to LangGraph in next attempt
+    
+    tool_calls = tool_calls_from_steps(response["intermediate_steps"])
+    if decision_cache is not None and tool_calls:
+        decision_cache.put(cache_key, term, tool_calls, response['output'])
+    
+    # Appended to log file in input order
+    return f"Processing term: {term}\n" + json.dumps(response['output'], ensure_ascii=False) + "\n\n"
+
+tasks = []
 with open(input_file, 'r', encoding='utf-8') as infile:
-    for line in infile:
+    for line_no, line in enumerate(infile, start=1):
         entry = json.loads(line)
         term = entry.get("normalized_term", "[DISCARD]")
         
@@ -157,23 +233,20 @@ with open(input_file, 'r', encoding='utf-8') as infile:
             synonyms = ""
         else:
             synonyms = "It has synonyms: " + ", ".join(synonyms) + " (do not map synonyms to database)"
-
-        print(f"[System] Processing term: {term}")
-        
-        # Create a prompt for the agent
-        input_text = f"""
-        Candidate term: "{term}"
-        {synonyms}    
-        Potential matches in database:
-        {search_glycan_structure(term)}
-        
-        Analyze the candidate term against potential matches and decide whether to map it to an existing term or add it as a new term.
-        """
-
-        response = agent_executor.invoke({"input": input_text}) # Move to LangGraph in next attempt
-        
-        # Append to log file
-        with open(log_file, 'a', encoding='utf-8') as log:
-            log.write(f"Processing term: {term}\n")
-            log.write(json.dumps(response['output'], ensure_ascii=False) + "\n\n")
-
+        if line_no in completed_lines or term in decided_terms:
+            continue
+        tasks.append((line_no, term, synonyms))
+
+# One bulk embedding pass for every term that the lexical short-circuit will not resolve
+if retriever is not None:
+    retriever.prefetch([term for _, term, _ in tasks if lexical_index is None or lexical_index.match(term) is None])
+
+try:
+    run_mapping(tasks, map_term, decision_writer, max_workers=MAX_WORKERS)
+finally:
+    synonym_buffer.flush()
+delete_unclaimed_adds(vector_store, recovered_adds, output_file, decision_writer.failed_lines)
+print(f"[System] Synonym updates: {synonym_buffer.updates} buffered, {synonym_buffer.flushes} batched writes")
+if decision_cache is not None:
+    print(f"[System] Decision cache: {decision_cache.hits} hits, {decision_cache.misses} misses")
+print(f"[System] Embedding cache: {embeddings.hits} hits, {embeddings.misses} misses")
@@ -0,0 +1,74 @@
+"""Content-addressed on-disk embedding cache shared by every Chroma instance in the project
+(01_create_vectordb.py, the mapping agents and supp_ai-assisted_term_extraction/01_vectorize_eog.py).
+
+Vectors are keyed by (model name, sha256 of the text) and stored as packed float32 blobs in SQLite, so
+rebuilding a vector store only sends new or changed texts to the embedding API."""
+from array import array
+import hashlib
+import sqlite3
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+BATCH_SIZE = 500 # Keys per SELECT; stays below SQLite's bound parameter limit
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings instance and serves previously embedded texts from the cache.
+    Queries share entries with documents: OpenAI embeddings are the same for both."""
+
+    def __init__(self, embeddings, cache_file, model=None):
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_file, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (model TEXT, text_hash TEXT, vector BLOB, PRIMARY KEY (model, text_hash))"
+        )
+        self.connection.commit()
+        self.hits, self.misses = 0, 0
+
+    def lookup(self, text_hashes) -> dict:
+        vectors = {}
+        with self.lock:
+            for i in range(0, len(text_hashes), BATCH_SIZE):
+                batch = text_hashes[i:i + BATCH_SIZE]
+                rows = self.connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [self.model, *batch]
+                )
+                for text_hash, blob in rows:
+                    vectors[text_hash] = array("f", blob).tolist()
+        return vectors
+
+    def store(self, text_hashes, vectors) -> None:
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(self.model, text_hash, array("f", vector).tobytes()) for text_hash, vector in zip(text_hashes, vectors)]
+            )
+            self.connection.commit()
+
+    def embed_documents(self, texts) -> list:
+        text_hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        vectors = self.lookup(list(dict.fromkeys(text_hashes)))
+
+        # Only texts not seen before (deduplicated) go to the embedding API, in its own bulk requests
+        missing = {}
+        for text_hash, text in zip(text_hashes, texts):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.store(list(missing), new_vectors)
+            # Round through float32 so a cold run returns the same vectors a warm run reads back
+            vectors.update(zip(missing, (array("f", vector).tolist() for vector in new_vectors)))
+
+        with self.lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return [vectors[text_hash] for text_hash in text_hashes]
+
+    def embed_query(self, text) -> list:
+        return self.embed_documents([text])[0]
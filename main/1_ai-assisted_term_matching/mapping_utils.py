@@ -0,0 +1,479 @@
+"""Shared helpers for the AI mapping agents (02a_ai_mapping_gsdv0.py, 03a_ai_mapping_pubdictionaries.py)."""
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from pathlib import Path
+import ast
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import unicodedata
+
+import numpy as np
+from langchain_core.documents import Document
+
+sys.path.append(str(Path(__file__).parents[1] / "3_utils"))
+from util_label_normalizer import LABEL_SEPARATORS, normalize_label
+from numpy_vector_store import normalize_rows
+
+# Input line currently being mapped by this worker; tools use it to attribute their decisions
+current_line = ContextVar("current_line", default=None)
+
+
+def load_checkpoint(journal_file, output_file) -> tuple:
+    """Reads the checkpoint journal and decisions file of a previous, possibly interrupted run.
+    Returns (completed_lines, decided_terms, recovered_adds, journaled_updates):
+    - completed_lines: input lines whose decisions were fully written
+    - decided_terms: source terms that already have a decision in the decisions file
+    - recovered_adds: {(line, term (lowercase)): term_uuid} documents added to the vector store by lines that never completed
+    - journaled_updates: [(term, term_uuid)] synonym additions journaled after the last synonym flush, or by lines
+      that never completed; re-applied because they may not have been written to the vector store"""
+    completed_lines = set()
+    pending_adds = {}
+    journaled_updates = []
+    flushed_updates = 0
+    if journal_file.exists():
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # torn last line of a crashed run
+                if event["event"] == "done":
+                    completed_lines.add(event["line"])
+                elif event["event"] == "mutation" and event["op"] == "add":
+                    pending_adds[event["line"], event["term"].strip().lower()] = event["id"]
+                elif event["event"] == "mutation" and event["op"] == "update":
+                    journaled_updates.append((event["line"], event["term"], event["id"]))
+                elif event["event"] == "flush":
+                    flushed_updates = len(journaled_updates) # Every update journaled so far is in the vector store
+    journaled_updates = [
+        (term, term_uuid) for i, (line_no, term, term_uuid) in enumerate(journaled_updates)
+        if i >= flushed_updates or line_no not in completed_lines
+    ]
+    recovered_adds = {key: term_uuid for key, term_uuid in pending_adds.items() if key[0] not in completed_lines}
+
+    decided_terms = set()
+    if output_file.exists():
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    decided_terms.add(json.loads(line)["source_term"])
+                except (json.JSONDecodeError, KeyError):
+                    continue
+    if completed_lines or decided_terms:
+        print(f"[System] Resuming: {len(completed_lines)} completed lines, {len(decided_terms)} decided terms, {len(recovered_adds)} recovered additions")
+    return completed_lines, decided_terms, recovered_adds, journaled_updates
+
+
+def claim_recovered_add(recovered_adds, term):
+    """Returns the term_uuid that the calling worker's input line added for term in an interrupted run, or None."""
+    return recovered_adds.pop((current_line.get(), term.strip().lower()), None)
+
+
+def delete_unclaimed_adds(vector_store, recovered_adds, output_file, failed_lines) -> list:
+    """Deletes the documents of recovered_adds that the resumed run did not claim again (e.g. two interrupted
+    lines added the same term and one now maps to the other's document), unless a written decision refers to
+    them or their line failed again and will be retried. Returns the deleted term_uuids."""
+    referenced = set()
+    if output_file.exists():
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    referenced.add(json.loads(line).get("mapped_to_uuid"))
+                except json.JSONDecodeError:
+                    continue
+    unclaimed = sorted({
+        term_uuid for (line_no, term), term_uuid in recovered_adds.items()
+        if line_no not in failed_lines and term_uuid not in referenced
+    })
+    if unclaimed:
+        vector_store.delete(ids=unclaimed)
+        print(f"[System] Deleted {len(unclaimed)} documents added by interrupted lines and no longer used")
+    return unclaimed
+
+
+class OrderedDecisionWriter:
+    """Buffers the tool decisions and log text of each input line and appends them to the
+    decisions/log files strictly in input order, however the workers finish.
+    With a journal_file, vector store mutations are journaled as they happen and every flushed
+    line is checkpointed, so an interrupted run can resume (see load_checkpoint)."""
+
+    def __init__(self, output_file, log_file, journal_file=None):
+        self.output_file = output_file
+        self.log_file = log_file
+        self.journal_file = journal_file
+        self.lock = threading.RLock()
+        self.expected_lines = []
+        self.next_index = 0
+        self.decisions = {}
+        self.logs = {}
+        self.failed_lines = set()
+
+    def expect(self, line_no) -> None:
+        """Registers an input line that will be mapped; lines are flushed in the order they were registered."""
+        with self.lock:
+            self.expected_lines.append(line_no)
+            self.decisions.setdefault(line_no, [])
+
+    def record(self, result) -> None:
+        """Called by the tools: attaches a decision to the input line of the calling worker."""
+        with self.lock:
+            self.decisions.setdefault(current_line.get(), []).append(result)
+
+    def record_mutation(self, op, term, term_uuid) -> None:
+        """Called by the tools right after they change the vector store ("add" or "update")."""
+        self._journal({"event": "mutation", "line": current_line.get(), "op": op, "term": term, "id": term_uuid})
+
+    def record_flush(self) -> None:
+        """Called by SynonymBuffer after buffered synonym updates were written to the vector store."""
+        self._journal({"event": "flush"})
+
+    def _journal(self, event) -> None:
+        if self.journal_file is None:
+            return
+        with self.lock:
+            with open(self.journal_file, 'a', encoding='utf-8') as journal:
+                journal.write(json.dumps(event, ensure_ascii=False) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+
+    def complete(self, line_no, log_text, failed=False) -> None:
+        """Marks an input line as done and flushes every contiguous completed line.
+        Failed lines are flushed but not checkpointed, so a resumed run retries them."""
+        with self.lock:
+            self.logs[line_no] = log_text
+            if failed:
+                self.failed_lines.add(line_no)
+            self._flush()
+
+    def _flush(self) -> None:
+        while self.next_index < len(self.expected_lines) and self.expected_lines[self.next_index] in self.logs:
+            line_no = self.expected_lines[self.next_index]
+            decisions = self.decisions.pop(line_no)
+            with open(self.output_file, 'a', encoding='utf-8') as outfile:
+                for result in decisions:
+                    outfile.write(json.dumps(result, ensure_ascii=False) + "\n")
+            with open(self.log_file, 'a', encoding='utf-8') as log:
+                log.write(self.logs.pop(line_no))
+            # Checkpoint only after the decisions are on disk
+            if line_no not in self.failed_lines:
+                self._journal({"event": "done", "line": line_no, "decisions": decisions})
+            self.next_index += 1
+
+
+def run_mapping(tasks, map_term, writer, max_workers=1) -> None:
+    """Maps (line_no, term, *args) tasks with map_term(term, *args) -> log text on a thread pool.
+    Decisions and logs are written in input order by the OrderedDecisionWriter."""
+    for line_no, *_ in tasks:
+        writer.expect(line_no)
+
+    def worker(line_no, term, *args):
+        current_line.set(line_no)
+        print(f"[System] Processing term: {term}")
+        try:
+            log_text = map_term(term, *args)
+            failed = False
+        except Exception as e:
+            print(f"[Error] Mapping failed for term '{term}' (line {line_no}): {e}")
+            log_text = f"Processing term: {term}\n[ERROR] {e}\n\n"
+            failed = True
+        writer.complete(line_no, log_text, failed)
+        print(f"[System] Completed processing term: {term}\n")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(worker, *task) for task in tasks]
+        for future in futures:
+            future.result()
+    return None
+
+
+def normalize_cache_term(term) -> str:
+    return " ".join(term.lower().split())
+
+
+def sha256_text(text) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DecisionCache:
+    """On-disk SQLite cache of agent decisions (the tool calls it made and its final output).
+    Keyed by the normalized candidate term, a fingerprint of the retrieved candidates (plus any other
+    prompt context), and the prompt/model version, so a hit can be replayed without an LLM round-trip."""
+
+    def __init__(self, cache_file, prompt, model):
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self.version = sha256_text(f"{model}\n{prompt}")
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_file, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, term TEXT, tool_calls TEXT, output TEXT)")
+        self.connection.commit()
+        self.hits, self.misses = 0, 0
+
+    def key(self, term, context) -> str:
+        return sha256_text(json.dumps([normalize_cache_term(term), sha256_text(context), self.version]))
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT term, tool_calls, output FROM decisions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {"term": row[0], "tool_calls": json.loads(row[1]), "output": json.loads(row[2])}
+
+    def put(self, key, term, tool_calls, output) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO decisions VALUES (?, ?, ?, ?)",
+                (key, term, json.dumps(tool_calls, ensure_ascii=False), json.dumps(output, ensure_ascii=False))
+            )
+            self.connection.commit()
+
+
+def tool_calls_from_steps(intermediate_steps) -> list:
+    """Extracts [{"tool", "args"}] from AgentExecutor intermediate steps (return_intermediate_steps=True)."""
+    return [{"tool": action.tool, "args": action.tool_input} for action, _ in intermediate_steps]
+
+
+def replay_tool_calls(tool_calls, cached_term, term, tools) -> None:
+    """Re-executes cached tool calls for term; arguments that named the cached term are rewritten to term."""
+    tools_by_name = {t.name: t for t in tools}
+    for tool_call in tool_calls:
+        args = dict(tool_call["args"])
+        if normalize_cache_term(args.get("term_name", "")) == normalize_cache_term(cached_term):
+            args["term_name"] = term
+        tools_by_name[tool_call["tool"]].invoke(args)
+
+
+def surface_key(label) -> str:
+    """Case-preserving NFKC form of a label, with surrounding and repeated whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", label).split())
+
+
+def parse_page_content(page_content) -> tuple:
+    """Splits a GSD document ("Term: ...\nExact Synonyms: [...]\n...") into (term, exact_synonyms)."""
+    lines = page_content.split("\n")
+    term = lines[0].split("Term: ", 1)[1] if lines and lines[0].startswith("Term: ") else ""
+    synonyms = lines[1].split("Exact Synonyms: ", 1)[1] if len(lines) > 1 and lines[1].startswith("Exact Synonyms: ") else ""
+    try:
+        synonyms = ast.literal_eval(synonyms) if synonyms.strip() else []
+    except (ValueError, SyntaxError):
+        synonyms = [synonyms]
+    if not isinstance(synonyms, list):
+        synonyms = [synonyms]
+    return term, synonyms
+
+
+class SynonymBuffer:
+    """Buffers exact synonym additions to vector store documents and writes them back in batches.
+    Synonyms are kept as structured metadata (a JSON list under "exact_synonyms") and rendered into the
+    "Exact Synonyms:" line of page_content on flush, so a document is re-embedded once per flush
+    instead of once per mapped term. Adding a label or synonym the document already has is a no-op."""
+
+    def __init__(self, vector_store, flush_size=100, on_flush=None, writer=None):
+        self.vector_store = vector_store
+        self.flush_size = flush_size
+        self.on_flush = on_flush # Called with each written term_uuid, e.g. BatchRetriever.refresh
+        self.writer = writer # OrderedDecisionWriter; each flush is journaled so a resumed run does not replay it
+        self.lock = threading.RLock()
+        self.pending = {} # term_uuid -> {"term", "synonyms", "page_content", "metadata"} not yet written
+        self.updates, self.flushes = 0, 0
+
+    def load(self, term_uuid) -> dict:
+        got = self.vector_store.get(ids=[term_uuid])
+        if not got["ids"]:
+            raise ValueError(f"Term UUID not found in vector store: {term_uuid}")
+        page_content = got["documents"][0]
+        metadata = dict(got["metadatas"][0] or {})
+        term, synonyms = parse_page_content(page_content)
+        if "exact_synonyms" in metadata:
+            synonyms = json.loads(metadata["exact_synonyms"])
+        return {"term": term, "synonyms": synonyms, "page_content": page_content, "metadata": metadata}
+
+    def add(self, term_uuid, synonym) -> bool:
+        """Returns True if synonym was new for the document and has been buffered."""
+        with self.lock:
+            record = self.pending.get(term_uuid) or self.load(term_uuid)
+            if synonym == record["term"] or synonym in record["synonyms"]:
+                return False
+            record["synonyms"].append(synonym)
+            self.pending[term_uuid] = record
+            self.updates += 1
+            if len(self.pending) >= self.flush_size:
+                self.flush()
+        return True
+
+    def replay(self, updates) -> None:
+        """Re-applies journaled (term, term_uuid) updates of an interrupted run and flushes them.
+        Documents that no longer exist (e.g. removed by a vector store sync) are skipped."""
+        for term, term_uuid in updates:
+            try:
+                self.add(term_uuid, term)
+            except ValueError as e:
+                print(f"[System] Skipping journaled synonym '{term}': {e}")
+        self.flush()
+
+    def flush(self) -> None:
+        """Upserts all buffered documents with one add_documents call (one batched embedding request)."""
+        with self.lock:
+            if not self.pending:
+                return
+            documents = []
+            for term_uuid, record in self.pending.items():
+                lines = record["page_content"].split("\n")
+                synonyms_line = f"Exact Synonyms: {record['synonyms']}"
+                if len(lines) > 1 and lines[1].startswith("Exact Synonyms:"):
+                    lines[1] = synonyms_line
+                else:
+                    lines.insert(1, synonyms_line)
+                metadata = dict(record["metadata"], exact_synonyms=json.dumps(record["synonyms"], ensure_ascii=False))
+                documents.append(Document(page_content="\n".join(lines), metadata=metadata, id=term_uuid))
+            self.vector_store.add_documents(documents=documents, ids=[doc.id for doc in documents]) # Chroma upserts by id
+            self.pending = {}
+            self.flushes += 1
+            if self.writer is not None:
+                self.writer.record_flush()
+            if self.on_flush is not None:
+                for doc in documents:
+                    self.on_flush(doc.id)
+
+
+class LexicalIndex:
+    """normalize_label(label or exact synonym) -> {term_uuid: (surface_form, field)} over the vector store collection,
+    plus the same keyed by the case-preserving NFKC surface form.
+    Used to map literal and separator-only variants without an LLM round-trip. normalize_label also folds case and
+    Greek letters, which can join distinct concepts ("I antigen" / "i antigen"), so such variants still go to the LLM."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = {}
+        self.exact = {}
+
+    @classmethod
+    def from_vector_store(cls, vector_store):
+        lexical_index = cls()
+        collection = vector_store.get(include=["documents"])
+        for term_uuid, page_content in zip(collection["ids"], collection["documents"]):
+            term, synonyms = parse_page_content(page_content)
+            lexical_index.add(term, term_uuid, "Term")
+            for synonym in synonyms:
+                lexical_index.add(synonym, term_uuid, "Exact Synonyms")
+        print(f"Built lexical index with {len(lexical_index.index)} normalized labels")
+        return lexical_index
+
+    def add(self, surface_form, term_uuid, field) -> None:
+        if not isinstance(surface_form, str) or not surface_form.strip():
+            return
+        with self.lock:
+            self.index.setdefault(normalize_label(surface_form), {}).setdefault(term_uuid, (surface_form, field))
+            self.exact.setdefault(surface_key(surface_form), {}).setdefault(term_uuid, (surface_form, field))
+
+    def match(self, term):
+        """Returns (term_uuid, reason) for an unambiguous exact, case-preserving match, or for the single
+        normalized-key candidate that differs from term only in separators; otherwise None."""
+        with self.lock:
+            candidates = self.exact.get(surface_key(term), {})
+            if len(candidates) == 1:
+                (term_uuid, (surface_form, field)), = candidates.items()
+                return term_uuid, f"exact match of '{term}' to {field} '{surface_form}'"
+            if candidates:
+                return None
+            candidates = self.index.get(normalize_label(term), {})
+            if len(candidates) != 1:
+                return None
+            (term_uuid, (surface_form, field)), = candidates.items()
+        if LABEL_SEPARATORS.sub("", surface_key(surface_form)) != LABEL_SEPARATORS.sub("", surface_key(term)):
+            return None
+        return term_uuid, f"separator-only match of '{term}' to {field} '{surface_form}'"
+
+
+def relevance_from_cosine(cosine, space):
+    """Converts cosine similarity of normalized embeddings to langchain_chroma's relevance score for the
+    collection's distance space, so score_threshold keeps the meaning it has in similarity_search_with_relevance_scores."""
+    if space == "l2":
+        # Chroma's l2 is the squared distance, 2 - 2cos for unit vectors
+        return 1.0 - (2.0 - 2.0 * cosine) / math.sqrt(2)
+    return cosine  # cosine and ip: 1 - (1 - cos)
+
+
+class BatchRetriever:
+    """Top-k retrieval for all input terms in one pass: query embeddings are requested in bulk and scored
+    against the collection's embedding matrix with a single matrix multiply.
+    Documents added or updated during the run are re-read with refresh() and re-scored against the stored
+    query vectors, so later terms still see them as candidates."""
+
+    def __init__(self, vector_store, embeddings, k=4, score_threshold=0.3):
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+        self.k = k
+        self.score_threshold = score_threshold
+        self.pool = 2 * k # Candidates kept per term, so a document whose score drops after an update can be replaced
+        self.lock = threading.Lock()
+        # Chroma reports its distance space; NumpyVectorStore always scores by cosine
+        collection = getattr(vector_store, "_collection", None)
+        self.space = (collection.metadata or {}).get("hnsw:space", "l2") if collection is not None else "cosine"
+
+        collection = vector_store.get(include=["embeddings", "documents"])
+        self.doc_ids = list(collection["ids"])
+        self.documents = dict(zip(self.doc_ids, collection["documents"]))
+        self.matrix = normalize_rows(np.asarray(collection["embeddings"], dtype=np.float32))
+        self.query_vectors = {}
+        self.candidates = {}
+        self.changed = {} # doc_id -> normalized embedding of documents added/updated after loading
+        print(f"Loaded {len(self.doc_ids)} document embeddings for batch retrieval")
+
+    def prefetch(self, terms) -> None:
+        """Embeds all not yet seen terms in bulk requests and stores their top candidates."""
+        with self.lock:
+            new_terms = [term for term in dict.fromkeys(terms) if term not in self.query_vectors]
+        if not new_terms:
+            return
+        queries = normalize_rows(np.asarray(self.embeddings.embed_documents(new_terms), dtype=np.float32))
+
+        pool = min(self.pool, len(self.doc_ids))
+        if pool > 0:
+            scores = queries @ self.matrix.T
+            top = np.argpartition(-scores, pool - 1, axis=1)[:, :pool]
+        with self.lock:
+            for i, term in enumerate(new_terms):
+                self.query_vectors[term] = queries[i]
+                if pool > 0:
+                    self.candidates[term] = [(self.doc_ids[j], float(scores[i, j])) for j in top[i]]
+                else:
+                    self.candidates[term] = []
+        if len(new_terms) > 1:
+            print(f"Prefetched retrieval candidates for {len(new_terms)} terms")
+
+    def refresh(self, doc_id) -> None:
+        """Re-reads a document added or updated in the vector store during the run."""
+        got = self.vector_store.get(ids=[doc_id], include=["embeddings", "documents"])
+        if not got["ids"]:
+            return
+        vector = normalize_rows(np.asarray(got["embeddings"], dtype=np.float32))[0]
+        with self.lock:
+            self.documents[doc_id] = got["documents"][0]
+            self.changed[doc_id] = vector
+
+    def search(self, term) -> list:
+        """Returns [(page_content, relevance_score)] for the top k candidates above score_threshold."""
+        if term not in self.query_vectors:
+            self.prefetch([term])
+        with self.lock:
+            query = self.query_vectors[term]
+            scored = {doc_id: score for doc_id, score in self.candidates[term] if doc_id not in self.changed}
+            if self.changed:
+                changed_ids = list(self.changed)
+                changed_scores = np.stack([self.changed[doc_id] for doc_id in changed_ids]) @ query
+                scored.update(zip(changed_ids, changed_scores.tolist()))
+            ranked = sorted(scored.items(), key=lambda item: item[1], reverse=True)[:self.k]
+            results = []
+            for doc_id, cosine in ranked:
+                score = relevance_from_cosine(cosine, self.space)
+                if score >= self.score_threshold:
+                    results.append((self.documents[doc_id], score))
+        return results
+
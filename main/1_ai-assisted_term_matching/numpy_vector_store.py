@@ -0,0 +1,220 @@
+"""Local vector store backend: a memory-mapped float32 .npy matrix plus a sidecar JSON metadata file.
+
+Drop-in for the part of the Chroma surface the mapping scripts use (get, add_documents/add_texts as
+upsert, update_document, delete, similarity_search_with_relevance_scores, as_retriever). Search is exact
+brute-force cosine over L2-normalized rows, which is deterministic and fast for collections of a few
+thousand documents; a snapshot of the store is a copy of the two files.
+
+    <persist_directory>/<collection_name>.npy   float32[n_docs, dim], row i belongs to ids[i]
+    <persist_directory>/<collection_name>.json  {"ids": [...], "documents": [...], "metadatas": [...]}
+"""
+from pathlib import Path
+from uuid import uuid4
+import io
+import json
+import os
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+
+def normalize_rows(matrix):
+    """L2-normalizes embedding rows so dot products are cosine similarities."""
+    if matrix.size == 0:
+        return matrix.reshape(0, 0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class NumpyVectorStore(VectorStore):
+    def __init__(self, collection_name, embedding_function, persist_directory, **kwargs):
+        self.embedding_function = embedding_function
+        persist_directory = Path(persist_directory)
+        persist_directory.mkdir(parents=True, exist_ok=True)
+        self.matrix_file = persist_directory / f"{collection_name}.npy"
+        self.metadata_file = persist_directory / f"{collection_name}.json"
+        self.lock = threading.RLock()
+
+        if self.matrix_file.exists() and self.metadata_file.exists():
+            self.matrix = np.load(self.matrix_file, mmap_mode="r")
+            with open(self.metadata_file, 'r', encoding='utf-8') as f:
+                sidecar = json.load(f)
+            self.ids, self.documents, self.metadatas = sidecar["ids"], sidecar["documents"], sidecar["metadatas"]
+            # Rows appended by a write that stopped before its sidecar was replaced are not part of the store
+            if self.matrix.shape[0] > len(self.ids):
+                self.matrix = self.matrix[:len(self.ids)]
+            if len(self.ids) != self.matrix.shape[0]:
+                raise ValueError(f"{self.matrix_file.name} has {self.matrix.shape[0]} rows but {self.metadata_file.name} lists {len(self.ids)} documents")
+        else:
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+            self.ids, self.documents, self.metadatas = [], [], []
+        self.index = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def save(self) -> None:
+        """Writes both files through temporary files, so readers never see a half-written store."""
+        matrix_tmp = self.matrix_file.with_suffix(".npy.tmp")
+        with open(matrix_tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        os.replace(matrix_tmp, self.matrix_file)
+        self.save_metadata()
+
+    def save_metadata(self) -> None:
+        """Rewrites only the sidecar JSON; the matrix file is left as it is."""
+        metadata_tmp = self.metadata_file.with_suffix(".json.tmp")
+        with open(metadata_tmp, 'w', encoding='utf-8') as f:
+            json.dump({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}, f, ensure_ascii=False)
+        os.replace(metadata_tmp, self.metadata_file)
+
+    def _write_rows(self, overwritten, appended) -> bool:
+        """Writes changed rows into the .npy file in place and appends new rows at its end, then re-maps it.
+
+        Returns False when the file cannot be extended in place (missing, other layout, header would grow).
+        """
+        if not self.matrix_file.exists() or self.matrix.size == 0:
+            return False
+        rows, dim = self.matrix.shape
+        with open(self.matrix_file, 'r+b') as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            data_offset = f.tell()
+            if fortran_order or dtype != np.float32 or len(shape) != 2 or shape[0] < rows or shape[1] != dim:
+                return False
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(header, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (rows + len(appended), dim)})
+            if header.tell() != data_offset:
+                return False
+            # Rows beyond the sidecar's count (left by an interrupted append) are overwritten and cut off
+            f.seek(data_offset + rows * dim * 4)
+            if appended:
+                f.write(np.ascontiguousarray(np.stack(appended), dtype=np.float32).tobytes())
+            f.truncate()
+            f.flush()
+            # The header is rewritten last, so an interrupted append leaves the previous shape
+            f.seek(0)
+            f.write(header.getvalue())
+        if overwritten:
+            writable = np.load(self.matrix_file, mmap_mode="r+")
+            for row, vector in overwritten.items():
+                writable[row] = vector
+            writable.flush()
+            del writable
+        self.matrix = np.load(self.matrix_file, mmap_mode="r")
+        return True
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs) -> list:
+        """Upserts by id, like Chroma: existing rows are overwritten, new ids are appended."""
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        vectors = normalize_rows(np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32))
+
+        with self.lock:
+            if vectors.size and self.matrix.size and self.matrix.shape[1] != vectors.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the stored {self.matrix.shape[1]}")
+            existing_rows = self.matrix.shape[0] if self.matrix.size else 0
+            overwritten = {}
+            appended = []
+            for doc_id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+                row = self.index.get(doc_id)
+                if row is None:
+                    row = len(self.ids)
+                    self.index[doc_id] = row
+                    self.ids.append(doc_id)
+                    self.documents.append(text)
+                    self.metadatas.append(dict(metadata or {}))
+                    appended.append(vector)
+                    continue
+                if row < existing_rows:
+                    overwritten[row] = vector
+                else:
+                    appended[row - existing_rows] = vector # Same id twice in one call
+                self.documents[row] = text
+                self.metadatas[row] = dict(metadata or {})
+            # Only changed and new rows are written; the existing matrix is never copied into memory
+            if self._write_rows(overwritten, appended):
+                self.save_metadata()
+            else:
+                matrix = np.array(self.matrix, dtype=np.float32) if existing_rows else np.empty((0, vectors.shape[1]), dtype=np.float32)
+                for row, vector in overwritten.items():
+                    matrix[row] = vector
+                if appended:
+                    matrix = np.vstack([matrix, np.stack(appended)])
+                self.matrix = matrix
+                self.save()
+        return ids
+
+    def update_document(self, document_id, document) -> None:
+        self.add_texts([document.page_content], [document.metadata], ids=[document_id])
+
+    def update_metadatas(self, ids, metadatas) -> None:
+        """Replaces the metadata of existing documents without re-embedding them; unknown ids are ignored."""
+        with self.lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                if doc_id in self.index:
+                    self.metadatas[self.index[doc_id]] = dict(metadata or {})
+            self.save_metadata()
+
+    def delete(self, ids=None, **kwargs) -> None:
+        with self.lock:
+            removed = {self.index[doc_id] for doc_id in ids or [] if doc_id in self.index}
+            if not removed:
+                return
+            keep = [row for row in range(len(self.ids)) if row not in removed]
+            self.matrix = np.array(self.matrix[keep], dtype=np.float32)
+            self.ids = [self.ids[row] for row in keep]
+            self.documents = [self.documents[row] for row in keep]
+            self.metadatas = [self.metadatas[row] for row in keep]
+            self.index = {doc_id: row for row, doc_id in enumerate(self.ids)}
+            self.save()
+
+    def get(self, ids=None, include=None, **kwargs) -> dict:
+        """Same result shape as Chroma.get: {"ids", "documents", "metadatas"[, "embeddings"]}."""
+        include = include or ["documents", "metadatas"]
+        with self.lock:
+            rows = list(range(len(self.ids))) if ids is None else [self.index[doc_id] for doc_id in ids if doc_id in self.index]
+            result = {"ids": [self.ids[row] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [self.documents[row] for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self.metadatas[row] for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = np.array(self.matrix[rows], dtype=np.float32) if rows else np.empty((0, 0), dtype=np.float32)
+        return result
+
+    def get_by_ids(self, ids) -> list:
+        got = self.get(ids=ids)
+        return [Document(page_content=text, metadata=metadata, id=doc_id) for doc_id, text, metadata in zip(got["ids"], got["documents"], got["metadatas"])]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs) -> list:
+        """Exact cosine search; ties are broken by insertion order so results are deterministic."""
+        query_vector = normalize_rows(np.asarray([self.embedding_function.embed_query(query)], dtype=np.float32))[0]
+        with self.lock:
+            if not self.ids:
+                return []
+            scores = self.matrix @ query_vector
+            top = np.argsort(-scores, kind="stable")[:k]
+            return [
+                (Document(page_content=self.documents[row], metadata=self.metadatas[row], id=self.ids[row]), float(scores[row]))
+                for row in top
+            ]
+
+    def similarity_search(self, query, k=4, **kwargs) -> list:
+        return [doc for doc, score in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score # Scores already are cosine similarities, as with Chroma's "cosine" space
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, collection_name="langchain", persist_directory=".", **kwargs):
+        vector_store = cls(collection_name=collection_name, embedding_function=embedding, persist_directory=persist_directory)
+        vector_store.add_texts(texts, metadatas, ids=ids)
+        return vector_store
@@ -0,0 +1,69 @@
+"""Readers and writers for the built glycan structure dictionary.
+
+Two on-disk formats are supported:
+- json:   {"nodes": [...], "edges": [...]} written with indent=2 (dictionary_<timestamp>.json)
+- ndjson: one JSON record per line (dictionary_<timestamp>.ndjson)
+    {"header": {"format": "gsd-ndjson", "version": 1, "nodes": N, "edges": M}}
+    {"node": {...}}   x N
+    {"edge": {...}}   x M
+"""
+from pathlib import Path
+import json
+
+NDJSON_FORMAT = "gsd-ndjson"
+NDJSON_VERSION = 1
+
+
+def write_dictionary_ndjson(output_file, nodes, edges, node_count, edge_count) -> None:
+    """Writes nodes and edges one record per line; nodes and edges may be generators so nothing is held in memory."""
+    with open(output_file, "w", encoding="utf-8") as f:
+        header = {"format": NDJSON_FORMAT, "version": NDJSON_VERSION, "nodes": node_count, "edges": edge_count}
+        f.write(json.dumps({"header": header}, ensure_ascii=False) + "\n")
+        for node in nodes:
+            f.write(json.dumps({"node": node}, ensure_ascii=False) + "\n")
+        for edge in edges:
+            f.write(json.dumps({"edge": edge}, ensure_ascii=False) + "\n")
+    return None
+
+
+def iter_dictionary_records(dictionary_file):
+    """Yields ("header", dict), then ("node", dict) / ("edge", dict) records from a dictionary file.
+    NDJSON files are streamed line by line; legacy .json files are loaded once and replayed in the same shape."""
+    dictionary_file = Path(dictionary_file)
+    if dictionary_file.suffix != ".ndjson":
+        with open(dictionary_file, "r", encoding="utf-8") as f:
+            gsd = json.load(f)
+        nodes, edges = gsd.get("nodes", []), gsd.get("edges", [])
+        yield "header", {"format": "gsd-json", "version": NDJSON_VERSION, "nodes": len(nodes), "edges": len(edges)}
+        for node in nodes:
+            yield "node", node
+        for edge in edges:
+            yield "edge", edge
+        return
+
+    with open(dictionary_file, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            kind, = record.keys()
+            if index == 0 and kind != "header":
+                raise ValueError(f"{dictionary_file.name} is missing the {NDJSON_FORMAT} header line")
+            if kind == "header" and record["header"].get("version") != NDJSON_VERSION:
+                raise ValueError(f"Unsupported {NDJSON_FORMAT} version in {dictionary_file.name}: {record['header'].get('version')}")
+            yield kind, record[kind]
+
+
+def iter_dictionary_nodes(dictionary_file):
+    """Yields only the nodes of a dictionary file."""
+    for kind, record in iter_dictionary_records(dictionary_file):
+        if kind == "node":
+            yield record
+
+
+def iter_dictionary_edges(dictionary_file):
+    """Yields only the edges of a dictionary file."""
+    for kind, record in iter_dictionary_records(dictionary_file):
+        if kind == "edge":
+            yield record
@@ -0,0 +1,219 @@
+"""Compiled, read-only lookup artifact for the glycan structure dictionary (dictionary_<timestamp>.gsdidx).
+
+The artifact is built once from the build_ontology output and opened with mmap, so every worker process
+shares the same page-cache copy and startup does not parse JSON. All integers are little-endian.
+
+Layout (each section 8-byte aligned):
+    header         HEADER struct (magic, version, counts and section offsets)
+    key_offsets    u32[n_keys + 1]   offsets into key_blob; keys are sorted normalized labels/exact synonyms
+    key_blob       utf-8 bytes of the sorted string table
+    post_offsets   u32[n_keys + 1]   offsets into postings
+    postings       u32[...]          node ids per key
+    slots          u32[n_slots]      open-addressing hash index, key id + 1 (0 = empty), linear probing
+    nodes          u64[n_nodes * 4]  (uuid_offset, uuid_length, payload_offset, payload_length), sorted by term_uuid
+    blob           term_uuids and JSON node payloads
+"""
+from pathlib import Path
+import hashlib
+import json
+import mmap
+import struct
+import sys
+
+from dictionary_io import iter_dictionary_nodes
+
+sys.path.append(str(Path(__file__).parents[1] / "3_utils"))
+from util_label_normalizer import normalize_label
+
+MAGIC = b"GSDIDX\x00\x01"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIIQQQQQQQ")
+U32 = struct.Struct("<I")
+NODE = struct.Struct("<QQQQ")
+
+
+def key_hash(key_bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), "little")
+
+
+def align(buffer) -> None:
+    buffer.extend(b"\x00" * (-len(buffer) % 8))
+
+
+def compile_dictionary_index(dictionary_file, output_file) -> None:
+    """Compiles a dictionary .json/.ndjson file into the memory-mappable .gsdidx artifact."""
+    nodes = sorted(iter_dictionary_nodes(dictionary_file), key=lambda node: node["term_uuid"])
+
+    # normalized label/exact synonym -> node ids
+    key_to_nodes = {}
+    for node_id, node in enumerate(nodes):
+        surface_forms = [node.get("lbl")]
+        for source in node.get("sources", []):
+            surface_forms.append(source.get("src_lbl"))
+            surface_forms.extend((source.get("src_content") or {}).get("exact_synonyms") or [])
+        for surface_form in surface_forms:
+            if surface_form:
+                key = normalize_label(surface_form)
+                if key:
+                    key_to_nodes.setdefault(key, set()).add(node_id)
+    keys = sorted(key_to_nodes)
+    key_bytes = [key.encode("utf-8") for key in keys]
+
+    n_slots = 8
+    while n_slots < 2 * len(keys):
+        n_slots *= 2
+    slots = [0] * n_slots
+    for key_id, encoded in enumerate(key_bytes):
+        slot = key_hash(encoded) & (n_slots - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (n_slots - 1)
+        slots[slot] = key_id + 1
+
+    buffer = bytearray(HEADER.size)
+    align(buffer)
+
+    key_offsets_off = len(buffer)
+    offset = 0
+    for encoded in key_bytes:
+        buffer += U32.pack(offset)
+        offset += len(encoded)
+    buffer += U32.pack(offset)
+    align(buffer)
+    key_blob_off = len(buffer)
+    for encoded in key_bytes:
+        buffer += encoded
+    align(buffer)
+
+    post_offsets_off = len(buffer)
+    offset = 0
+    for key in keys:
+        buffer += U32.pack(offset)
+        offset += len(key_to_nodes[key])
+    buffer += U32.pack(offset)
+    align(buffer)
+    postings_off = len(buffer)
+    for key in keys:
+        for node_id in sorted(key_to_nodes[key]):
+            buffer += U32.pack(node_id)
+    align(buffer)
+
+    slots_off = len(buffer)
+    for slot in slots:
+        buffer += U32.pack(slot)
+    align(buffer)
+
+    nodes_off = len(buffer)
+    blob_off = nodes_off + NODE.size * len(nodes)
+    blob = bytearray()
+    for node in nodes:
+        uuid_bytes = node["term_uuid"].encode("utf-8")
+        payload_bytes = json.dumps(node, ensure_ascii=False).encode("utf-8")
+        uuid_off = blob_off + len(blob)
+        blob += uuid_bytes
+        payload_off = blob_off + len(blob)
+        blob += payload_bytes
+        buffer += NODE.pack(uuid_off, len(uuid_bytes), payload_off, len(payload_bytes))
+    buffer += blob
+
+    HEADER.pack_into(buffer, 0, MAGIC, VERSION, len(keys), n_slots, len(nodes),
+                     key_offsets_off, key_blob_off, post_offsets_off, postings_off, slots_off, nodes_off, len(buffer))
+
+    output_file = Path(output_file)
+    tmp_file = output_file.with_name(output_file.name + ".tmp")
+    with open(tmp_file, "wb") as f:
+        f.write(buffer)
+    tmp_file.replace(output_file)
+    print(f"[COMPLETED] Compiled {len(nodes)} nodes and {len(keys)} lookup keys to {output_file.name}")
+    return None
+
+
+class DictionaryIndex:
+    """Read-only, memory-mapped view of a .gsdidx artifact.
+
+    index = DictionaryIndex("dictionary.gsdidx")
+    index.lookup("Sialyl Lewis X")   -> ["GSD:..."]
+    index.get_node("GSD:...")        -> node dict as written by build_ontology
+    """
+
+    def __init__(self, index_file):
+        self._file = open(index_file, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.n_keys, self.n_slots, self.n_nodes,
+         self._key_offsets_off, self._key_blob_off, self._post_offsets_off, self._postings_off,
+         self._slots_off, self._nodes_off, size) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{Path(index_file).name} is not a version {VERSION} GSD index")
+        if size != len(self._mm):
+            self.close()
+            raise ValueError(f"{Path(index_file).name} is truncated")
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.n_nodes
+
+    def _u32(self, section_off, index) -> int:
+        return U32.unpack_from(self._mm, section_off + 4 * index)[0]
+
+    def _key(self, key_id) -> bytes:
+        start = self._key_offsets_off
+        return self._mm[self._key_blob_off + self._u32(start, key_id):self._key_blob_off + self._u32(start, key_id + 1)]
+
+    def _node(self, node_id) -> tuple:
+        return NODE.unpack_from(self._mm, self._nodes_off + NODE.size * node_id)
+
+    def _term_uuid(self, node_id) -> str:
+        uuid_off, uuid_len, _, _ = self._node(node_id)
+        return self._mm[uuid_off:uuid_off + uuid_len].decode("utf-8")
+
+    def keys(self):
+        """Yields the sorted normalized lookup keys."""
+        for key_id in range(self.n_keys):
+            yield self._key(key_id).decode("utf-8")
+
+    def lookup(self, text) -> list:
+        """Returns the term_uuids whose label or exact synonym matches text under normalize_label."""
+        key = normalize_label(text).encode("utf-8")
+        mask = self.n_slots - 1
+        slot = key_hash(key) & mask
+        while True:
+            value = self._u32(self._slots_off, slot)
+            if value == 0:
+                return []
+            if self._key(value - 1) == key:
+                start = self._u32(self._post_offsets_off, value - 1)
+                end = self._u32(self._post_offsets_off, value)
+                return [self._term_uuid(self._u32(self._postings_off, i)) for i in range(start, end)]
+            slot = (slot + 1) & mask
+
+    def get_node(self, term_uuid):
+        """Binary-searches the sorted node table and decodes only that node's payload; returns None if absent."""
+        target = term_uuid.encode("utf-8")
+        lo, hi = 0, self.n_nodes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            uuid_off, uuid_len, payload_off, payload_len = self._node(mid)
+            current = self._mm[uuid_off:uuid_off + uuid_len]
+            if current == target:
+                return json.loads(self._mm[payload_off:payload_off + payload_len])
+            if current < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python dictionary_mmap.py <dictionary.json|dictionary.ndjson> <output.gsdidx>")
+        quit()
+    compile_dictionary_index(sys.argv[1], sys.argv[2])
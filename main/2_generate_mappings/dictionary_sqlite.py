@@ -0,0 +1,147 @@
+"""Exports the built glycan structure dictionary into a normalized, indexed SQLite database.
+
+Tables:
+- nodes(term_uuid, lbl, lbl_norm)
+- sources(src_uuid, term_uuid, src_lbl, src, gsd_id, classification, definition, description, iupac_condensed, src_content)
+- gtc_ids(term_uuid, src_uuid, gtc_id)
+- synonyms(term_uuid, src_uuid, synonym, synonym_norm, kind)   kind: "exact" | "related"
+- edges(subj, pred, obj, comment, xref)
+Lists/objects that are not broken out into their own table are stored as JSON text (src_content, edges.xref).
+"""
+from pathlib import Path
+import json
+import sqlite3
+import sys
+
+from dictionary_io import iter_dictionary_records
+
+sys.path.append(str(Path(__file__).parents[1] / "3_utils"))
+from util_label_normalizer import normalize_label
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE nodes (
+    term_uuid TEXT PRIMARY KEY,
+    lbl TEXT,
+    lbl_norm TEXT
+);
+CREATE TABLE sources (
+    src_uuid TEXT PRIMARY KEY,
+    term_uuid TEXT NOT NULL REFERENCES nodes(term_uuid),
+    src_lbl TEXT,
+    src TEXT,
+    gsd_id TEXT,
+    classification TEXT,
+    definition TEXT,
+    description TEXT,
+    iupac_condensed TEXT,
+    src_content TEXT
+);
+CREATE TABLE gtc_ids (
+    term_uuid TEXT NOT NULL REFERENCES nodes(term_uuid),
+    src_uuid TEXT NOT NULL REFERENCES sources(src_uuid),
+    gtc_id TEXT NOT NULL
+);
+CREATE TABLE synonyms (
+    term_uuid TEXT NOT NULL REFERENCES nodes(term_uuid),
+    src_uuid TEXT NOT NULL REFERENCES sources(src_uuid),
+    synonym TEXT NOT NULL,
+    synonym_norm TEXT NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE TABLE edges (
+    subj TEXT NOT NULL,
+    pred TEXT NOT NULL,
+    obj TEXT NOT NULL,
+    comment TEXT,
+    xref TEXT
+);
+"""
+
+# Created after the bulk load, which is faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX idx_nodes_lbl_norm ON nodes(lbl_norm);
+CREATE INDEX idx_sources_term_uuid ON sources(term_uuid);
+CREATE INDEX idx_sources_gsd_id ON sources(gsd_id);
+CREATE INDEX idx_gtc_ids_gtc_id ON gtc_ids(gtc_id);
+CREATE INDEX idx_gtc_ids_term_uuid ON gtc_ids(term_uuid);
+CREATE INDEX idx_synonyms_synonym_norm ON synonyms(synonym_norm);
+CREATE INDEX idx_synonyms_term_uuid ON synonyms(term_uuid);
+CREATE INDEX idx_edges_subj ON edges(subj);
+CREATE INDEX idx_edges_obj ON edges(obj);
+"""
+
+
+def export_dictionary_sqlite(dictionary_file, sqlite_file) -> None:
+    """Streams a dictionary .json/.ndjson file into a fresh SQLite database at sqlite_file."""
+    sqlite_file = Path(sqlite_file)
+    tmp_file = sqlite_file.with_name(sqlite_file.name + ".tmp")
+    tmp_file.unlink(missing_ok=True)
+
+    connection = sqlite3.connect(tmp_file)
+    connection.executescript(SCHEMA)
+    node_count, edge_count = 0, 0
+    with connection:
+        for kind, record in iter_dictionary_records(dictionary_file):
+            if kind == "header":
+                connection.execute("INSERT INTO meta VALUES (?, ?)", ("source", Path(dictionary_file).name))
+            elif kind == "node":
+                insert_node(connection, record)
+                node_count += 1
+            elif kind == "edge":
+                connection.execute(
+                    "INSERT INTO edges VALUES (?, ?, ?, ?, ?)",
+                    (record.get("subj"), record.get("pred"), record.get("obj"), record.get("comment"), json.dumps(record.get("xref") or [], ensure_ascii=False))
+                )
+                edge_count += 1
+        connection.executescript(INDEXES)
+    connection.close()
+    tmp_file.replace(sqlite_file)
+
+    print(f"[COMPLETED] Exported {node_count} nodes and {edge_count} edges to {sqlite_file.name}")
+    return None
+
+
+def insert_node(connection, node) -> None:
+    term_uuid = node.get("term_uuid")
+    lbl = node.get("lbl") or ""
+    connection.execute("INSERT INTO nodes VALUES (?, ?, ?)", (term_uuid, lbl, normalize_label(lbl)))
+    for source in node.get("sources", []):
+        src_uuid = source.get("src_uuid")
+        src_content = source.get("src_content") or {}
+        connection.execute(
+            "INSERT INTO sources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                src_uuid, term_uuid, source.get("src_lbl"), source.get("src"),
+                src_content.get("gsd_id"), src_content.get("classification"), src_content.get("definition"),
+                src_content.get("description"), src_content.get("iupac_condensed"),
+                json.dumps(src_content, ensure_ascii=False)
+            )
+        )
+        connection.executemany(
+            "INSERT INTO gtc_ids VALUES (?, ?, ?)",
+            [(term_uuid, src_uuid, gtc_id) for gtc_id in src_content.get("gtc_id") or [] if gtc_id]
+        )
+        for kind in ["exact", "related"]:
+            connection.executemany(
+                "INSERT INTO synonyms VALUES (?, ?, ?, ?, ?)",
+                [(term_uuid, src_uuid, synonym, normalize_label(synonym), kind) for synonym in src_content.get(f"{kind}_synonyms") or [] if synonym]
+            )
+    return None
+
+
+def find_term_uuids(connection, label) -> list:
+    """Returns term_uuids whose label or any synonym matches label under normalize_label."""
+    label_norm = normalize_label(label)
+    rows = connection.execute(
+        "SELECT term_uuid FROM nodes WHERE lbl_norm = ? UNION SELECT term_uuid FROM synonyms WHERE synonym_norm = ?",
+        (label_norm, label_norm)
+    )
+    return sorted(row[0] for row in rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python dictionary_sqlite.py <dictionary.json|dictionary.ndjson> <output.sqlite>")
+        quit()
+    export_dictionary_sqlite(sys.argv[1], sys.argv[2])
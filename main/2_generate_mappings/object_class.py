@@ -56,6 +56,7 @@ class Edge(BaseModel):
     pred: str
     obj: str
     comment: Optional[str] = None
+    xref: Optional[List[str]] = None
     
 #############################################################################
 # Layer 0
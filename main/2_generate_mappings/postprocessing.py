@@ -4,25 +4,80 @@ from datetime import datetime
 from postprocessing_utils import backup_existing_file
 from postprocessing_utils import create_processing_queue
 from postprocessing_utils import quality_check_jsonl_files
-from postprocessing_utils import update_master_registered_terms_file
+from postprocessing_utils import load_build_manifest
+from postprocessing_utils import find_changed_sources
+from postprocessing_utils import load_term_contributions
+from postprocessing_utils import merge_source_metadata_indexes
+from postprocessing_utils import save_build_manifest
+from postprocessing_utils import hash_files
+from postprocessing_utils import output_kinds
+from postprocessing_utils import expected_output_kinds
+from postprocessing_utils import merge_master_registered_terms_files
 from postprocessing_utils import post_merge_quality_check
-from postprocessing_utils import update_master_registered_edges_file
+from postprocessing_utils import merge_master_registered_edges_files
 from postprocessing_utils import build_ontology
+from dictionary_sqlite import export_dictionary_sqlite
+from dictionary_mmap import compile_dictionary_index
 
 timestamp = datetime.now().strftime("_%Y%m%d_%H%M%S")
 
 OUTF_NAME_NODES = f"master_nodes{timestamp}.json"
 OUTF_NAME_EDGES = f"master_edges{timestamp}.json"
-OUTF_NAME_GSD = f"dictionary{timestamp}.json"
+OUTPUT_FORMAT = "json" # "json" for a single dictionary.json; "ndjson" to stream one record per line (see dictionary_io.py)
+OUTF_NAME_GSD = f"dictionary{timestamp}.{OUTPUT_FORMAT}"
+SQLITE_EXPORT = False # Set to True to also export the dictionary to an indexed SQLite database for point lookups
+OUTF_NAME_SQLITE = f"dictionary{timestamp}.sqlite"
+MMAP_INDEX_EXPORT = False # Set to True to also compile the read-only, memory-mappable lookup artifact for taggers
+OUTF_NAME_MMAP_INDEX = f"dictionary{timestamp}.gsdidx"
 
 SRC_DIR = Path(__file__).parents[2]
 RAW_DIR = SRC_DIR / "data" / "raw"
 PRC_DIR = SRC_DIR / "data" / "processed"
 BCK_DIR = SRC_DIR / "data" / "processed" / "backup" / f"backup_{timestamp}"
+QC_DIR = SRC_DIR / "data" / "processed" / "qc_reports" # Kept out of the *.json backup sweep of PRC_DIR
+CACHE_DIR = SRC_DIR / "data" / "cache" / "postprocessing"
+MANIFEST_PATH = CACHE_DIR / "build_manifest.json"
+
+INCREMENTAL_MODE = True # Set to False to ignore the build manifest and rebuild every source from scratch
+
+# "src_eog" should be processed first
+PROCESSING_ORDER = ["src_eog", "src_gsdv0", "src_pubdictionaries", "src_n-compo", "src_glygen_curators"]
+
+# Create a processing queue based on the defined order
+processing_queue_terms, processing_queue_edges = create_processing_queue(PROCESSING_ORDER, RAW_DIR)
+
+# Output settings and pipeline modules the previous build was made with; a change forces new outputs.
+# This script holds only settings, so editing them does not count as a code change.
+build_config = {
+    "output_format": OUTPUT_FORMAT,
+    "sqlite_export": SQLITE_EXPORT,
+    "mmap_index_export": MMAP_INDEX_EXPORT,
+    "code_sha256": hash_files(
+        sorted(path for path in Path(__file__).parent.glob("*.py") if path.name != Path(__file__).name)
+        + [Path(__file__).parents[1] / "3_utils" / "util_label_normalizer.py"]
+    ),
+}
+
+# Compare content hashes of the raw sources against the previous build
+manifest = load_build_manifest(MANIFEST_PATH)
+if manifest["sources"] and manifest.get("config", {}).get("code_sha256") != build_config["code_sha256"]:
+    print("- Pipeline code changed, rebuilding all sources")
+    manifest["sources"] = {}
+if not INCREMENTAL_MODE:
+    manifest["sources"] = {}
+file_hashes, changed_sources = find_changed_sources(processing_queue_terms, processing_queue_edges, manifest)
+if (
+    not changed_sources
+    and manifest.get("config") == build_config
+    and sorted(output_kinds(manifest["outputs"])) == sorted(expected_output_kinds(build_config))
+    and all((PRC_DIR / output).exists() for output in manifest["outputs"])
+):
+    print(f"[COMPLETED] Dictionary is up to date: {', '.join(manifest['outputs'])}")
+    quit()
 
 BCK_DIR.mkdir(parents=True, exist_ok=True)
 
-json_files = list(PRC_DIR.glob("*.json"))
+json_files = list(PRC_DIR.glob("*.json")) + list(PRC_DIR.glob("*.ndjson")) + list(PRC_DIR.glob("*.sqlite")) + list(PRC_DIR.glob("*.gsdidx"))
 if json_files:
     for json_file in json_files:
         backup_name = json_file.name
@@ -47,27 +102,42 @@ if QC_MODE:
 else:
     print("="*80 + "\nRunning in normal mode...")
 
-# "src_eog" should be processed first
-PROCESSING_ORDER = ["src_eog", "src_gsdv0", "src_pubdictionaries", "src_n-compo", "src_glygen_curators"]
-
-# Create a processing queue based on the defined order
-processing_queue_terms, processing_queue_edges = create_processing_queue(PROCESSING_ORDER, RAW_DIR)
-
-# Quality check for duplicate term_uuid and src_uuid within each jsonl file
+# Quality check for duplicate term_uuid and src_uuid within each jsonl file (and src_uuid across files)
 MANDATORY_FIELDS_TERMS = ["term", "xref", "term_uuid", "src_uuid"]
 MANDATORY_FIELDS_EDGES = ["subj", "pred", "obj", "xref"]
-quality_check_jsonl_files(processing_queue_terms, processing_queue_edges, MANDATORY_FIELDS_TERMS, MANDATORY_FIELDS_EDGES)
+QC_DIR.mkdir(parents=True, exist_ok=True)
+OUTF_PATH_QC = QC_DIR / f"qc_pre_merge{timestamp}.json"
+quality_check_jsonl_files(processing_queue_terms, processing_queue_edges, MANDATORY_FIELDS_TERMS, MANDATORY_FIELDS_EDGES, report_file=OUTF_PATH_QC)
 
-# Update master_registered_terms.json by merging each terms.jsonl file in the processing queue
-for term_file in processing_queue_terms:
-    update_master_registered_terms_file(term_file, OUTF_PATH_NODES)
+# Reuse cached contributions of unchanged sources; re-parse and re-enrich changed ones
+print("\n" + "="*80 + "\nLoading source contributions...")
+term_contributions = load_term_contributions(processing_queue_terms, file_hashes, manifest, CACHE_DIR)
+
+# Update master_registered_terms.json by merging each terms.jsonl file in the processing queue (written once)
+merge_master_registered_terms_files(processing_queue_terms, OUTF_PATH_NODES, term_contributions)
     
 # Post-merge quality check for duplicate term_uuid, gsd_id, and src_uuid across the entire master file
-post_merge_quality_check(OUTF_PATH_NODES)
+post_merge_quality_check(OUTF_PATH_NODES, report_file=QC_DIR / f"qc_post_merge{timestamp}.json")
 
-# Update master_registered_edges.json by merging each edges.jsonl file in the processing queue    
-for edge_file in processing_queue_edges:
-    update_master_registered_edges_file(edge_file, OUTF_PATH_EDGES)
+# Update master_registered_edges.json by merging each edges.jsonl file in the processing queue (written once)
+merge_master_registered_edges_files(processing_queue_edges, OUTF_PATH_EDGES)
 
 # Build the final comprehensive glycan structure dictionary
-build_ontology(OUTF_PATH_NODES, OUTF_PATH_EDGES, OUTF_PATH_GSD, processing_queue_terms)
\ No newline at end of file
+source_metadata_index = merge_source_metadata_indexes(term_contributions)
+build_ontology(OUTF_PATH_NODES, OUTF_PATH_EDGES, OUTF_PATH_GSD, processing_queue_terms, source_metadata_index, OUTPUT_FORMAT)
+
+# Export the dictionary to SQLite for indexed point lookups (term_uuid, src_uuid, gsd_id, gtc_id, normalized labels)
+outputs = [OUTF_PATH_NODES, OUTF_PATH_EDGES, OUTF_PATH_GSD]
+if SQLITE_EXPORT:
+    OUTF_PATH_SQLITE = PRC_DIR / OUTF_NAME_SQLITE
+    export_dictionary_sqlite(OUTF_PATH_GSD, OUTF_PATH_SQLITE)
+    outputs.append(OUTF_PATH_SQLITE)
+
+# Compile the memory-mapped label/exact synonym -> term_uuid lookup artifact
+if MMAP_INDEX_EXPORT:
+    OUTF_PATH_MMAP_INDEX = PRC_DIR / OUTF_NAME_MMAP_INDEX
+    compile_dictionary_index(OUTF_PATH_GSD, OUTF_PATH_MMAP_INDEX)
+    outputs.append(OUTF_PATH_MMAP_INDEX)
+
+# Record source hashes and contributions so the next run can skip unchanged sources
+save_build_manifest(MANIFEST_PATH, file_hashes, term_contributions, processing_queue_edges, outputs, build_config)
@@ -1,5 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import hashlib
 import json
+import multiprocessing
+import sys
+
+from dictionary_io import write_dictionary_ndjson
+
+sys.path.append(str(Path(__file__).parents[1] / "3_utils"))
+from util_label_normalizer import normalize_label
+
+MANIFEST_VERSION = 2 # Bump when the cached contributions or output format change
 
 
 def backup_existing_file(SRC_DIR: Path) -> None:   
@@ -54,104 +65,134 @@ def create_processing_queue(PROCESSING_ORDER, RAW_DIR) -> list:
         print(f"Ignored files: {[f.name for f in terms_files]}")
     return processing_queue_terms, processing_queue_edges
 
-def quality_check_jsonl_files(processing_queue_terms, processing_queue_edges, MANDATORY_FIELDS_TERMS, MANDATORY_FIELDS_EDGES) -> None:
-    # terms.jsonl
-    print("\n" + "="*80 + "\nRunning pre-merge quality check...")
-    seen_src_uuids = []
-    for term_file in processing_queue_terms:
-        seen_term_uuids = []
-        with open(term_file, "r") as f:
-            for index, line in enumerate(f):
-                try:
-                    data = json.loads(line)
-                except json.JSONDecodeError as e:
-                    print(f"[Error] JSONDecodeError in {term_file.parent.name}/{term_file.name}: {e}; line {index + 1}")
-                    quit()
-                
-                mandatory_fields = MANDATORY_FIELDS_TERMS
-                for field in mandatory_fields:
-                    if field not in data:
-                        print(f"[Error] Missing mandatory field '{field}' in {term_file.parent.name}/{term_file.name}; line {index + 1}")
-                        quit()
-                
-                term_uuid = data["term_uuid"]
-                if term_uuid.startswith("GSD:") == False:
-                    print(f"[Error] term_uuid '{term_uuid}' does not start with 'GSD:' in {term_file.parent.name}/{term_file.name}; line {index + 1}")
-                    quit()
+def qc_error(file_key, line, error, message) -> dict:
+    return {"file": file_key, "line": line, "error": error, "message": message}
+
+def check_terms_file(term_file, MANDATORY_FIELDS_TERMS) -> dict:
+    """Checks one terms.jsonl and collects every violation instead of stopping at the first.
+    Returns {"file", "kind", "lines", "errors", "src_uuids"} where src_uuids maps src_uuid -> first line for cross-file checks."""
+    file_key = f"{term_file.parent.name}/{term_file.name}"
+    errors = []
+    seen_term_uuids = {}
+    seen_src_uuids = {}
+    lines = 0
+    with open(term_file, "r") as f:
+        for index, line in enumerate(f):
+            lines = index + 1
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                errors.append(qc_error(file_key, index + 1, "JSONDecodeError", f"JSONDecodeError in {file_key}: {e}"))
+                continue
+            
+            for field in MANDATORY_FIELDS_TERMS:
+                if field not in data:
+                    errors.append(qc_error(file_key, index + 1, "MissingField", f"Missing mandatory field '{field}' in {file_key}"))
+            
+            term_uuid = data.get("term_uuid")
+            if isinstance(term_uuid, str):
+                if not term_uuid.startswith("GSD:"):
+                    errors.append(qc_error(file_key, index + 1, "InvalidPrefix", f"term_uuid '{term_uuid}' does not start with 'GSD:' in {file_key}"))
                 if term_uuid in seen_term_uuids:
-                    print(f"[Error] Duplicate term_uuid '{term_uuid}' in {term_file.parent.name}/{term_file.name}; line {index + 1}")
-                    quit()
+                    errors.append(qc_error(file_key, index + 1, "DuplicateTermUUID", f"Duplicate term_uuid '{term_uuid}' in {file_key} (first seen on line {seen_term_uuids[term_uuid]})"))
                 else:
-                    seen_term_uuids.append(term_uuid)
-                
-                src_uuid = data["src_uuid"]
-                if src_uuid.startswith("SRC:") == False:
-                    print(f"[Error] src_uuid '{src_uuid}' does not start with 'SRC:' in {term_file.parent.name}/{term_file.name}; line {index + 1}")
-                    quit()
+                    seen_term_uuids[term_uuid] = index + 1
+            
+            src_uuid = data.get("src_uuid")
+            if isinstance(src_uuid, str):
+                if not src_uuid.startswith("SRC:"):
+                    errors.append(qc_error(file_key, index + 1, "InvalidPrefix", f"src_uuid '{src_uuid}' does not start with 'SRC:' in {file_key}"))
                 if src_uuid in seen_src_uuids:
-                    print(f"[Error] Duplicate src_uuid '{src_uuid}' in {term_file.parent.name}/{term_file.name}; line {index + 1}")
-                    quit()
+                    errors.append(qc_error(file_key, index + 1, "DuplicateSrcUUID", f"Duplicate src_uuid '{src_uuid}' in {file_key} (first seen on line {seen_src_uuids[src_uuid]})"))
                 else:
-                    seen_src_uuids.append(src_uuid)
-            print(f"[PASS] QC of {term_file.parent.name}/{term_file.name} - Lines: {index + 1}")
+                    seen_src_uuids[src_uuid] = index + 1
+    return {"file": file_key, "kind": "terms", "lines": lines, "errors": errors, "src_uuids": seen_src_uuids}
+
+def check_edges_file(edge_file, MANDATORY_FIELDS_EDGES) -> dict:
+    """Checks one edges.jsonl and collects every violation instead of stopping at the first."""
+    file_key = f"{edge_file.parent.name}/{edge_file.name}"
+    errors = []
+    lines = 0
+    with open(edge_file, "r") as f:
+        for index, line in enumerate(f):
+            lines = index + 1
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                errors.append(qc_error(file_key, index + 1, "JSONDecodeError", f"JSONDecodeError in {file_key}: {e}"))
+                continue
             
-    # edges.jsonl
-    print("-"*80)
-    for edge_file in processing_queue_edges:
-        with open(edge_file, "r") as f:
-            for index, line in enumerate(f):
-                try:
-                    data = json.loads(line)
-                except json.JSONDecodeError as e:
-                    print(f"[Error] JSONDecodeError in {edge_file.parent.name}/{edge_file.name}: {e}; line {index + 1}")
-                    quit()
-                
-                mandatory_fields = MANDATORY_FIELDS_EDGES
-                for field in mandatory_fields:
-                    if field not in data:
-                        print(f"[Error] Missing mandatory field '{field}' in {edge_file.parent.name}/{edge_file.name}; line {index + 1}")
-                        quit()
-                
-                subj = data["subj"]
-                if subj.startswith("GSD:") == False:
-                    print(f"[Error] subj '{subj}' does not start with 'GSD:' in {edge_file.parent.name}/{edge_file.name}; line {index + 1}")
-                    quit()
-                
-                obj = data["obj"]
-                if obj.startswith("GSD:") == False:
-                    print(f"[Error] obj '{obj}' does not start with 'GSD:' in {edge_file.parent.name}/{edge_file.name}; line {index + 1}")
-                    quit()
-            print(f"[PASS] QC of {edge_file.parent.name}/{edge_file.name} - Lines: {index + 1}")
-    return None
+            for field in MANDATORY_FIELDS_EDGES:
+                if field not in data:
+                    errors.append(qc_error(file_key, index + 1, "MissingField", f"Missing mandatory field '{field}' in {file_key}"))
+            
+            for field in ["subj", "obj"]:
+                value = data.get(field)
+                if isinstance(value, str) and not value.startswith("GSD:"):
+                    errors.append(qc_error(file_key, index + 1, "InvalidPrefix", f"{field} '{value}' does not start with 'GSD:' in {file_key}"))
+    return {"file": file_key, "kind": "edges", "lines": lines, "errors": errors, "src_uuids": {}}
+
+def quality_check_jsonl_files(processing_queue_terms, processing_queue_edges, MANDATORY_FIELDS_TERMS, MANDATORY_FIELDS_EDGES, max_workers=None, report_file=None) -> dict:
+    """Runs the pre-merge QC over every terms/edges file in a process pool and collects all violations into one report.
+    Cross-file src_uuid collisions are resolved afterwards in processing order. Quits after printing the report if any check failed."""
+    print("\n" + "="*80 + "\nRunning pre-merge quality check...")
+    tasks = [(check_terms_file, term_file, MANDATORY_FIELDS_TERMS) for term_file in processing_queue_terms]
+    tasks += [(check_edges_file, edge_file, MANDATORY_FIELDS_EDGES) for edge_file in processing_queue_edges]
+    
+    # Fork keeps workers from re-importing (and re-running) the calling script; fall back to serial elsewhere
+    if max_workers != 1 and "fork" in multiprocessing.get_all_start_methods():
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            futures = [executor.submit(check, source_file, mandatory_fields) for check, source_file, mandatory_fields in tasks]
+            file_results = [future.result() for future in futures]
+    else:
+        file_results = [check(source_file, mandatory_fields) for check, source_file, mandatory_fields in tasks]
+    
+    # Cross-file src_uuid collisions
+    seen_src_uuids = {}
+    for file_result in file_results:
+        for src_uuid, line in file_result["src_uuids"].items():
+            if src_uuid in seen_src_uuids:
+                first_file, first_line = seen_src_uuids[src_uuid]
+                file_result["errors"].append(qc_error(file_result["file"], line, "DuplicateSrcUUID", f"Duplicate src_uuid '{src_uuid}' in {file_result['file']} (first seen in {first_file}; line {first_line})"))
+            else:
+                seen_src_uuids[src_uuid] = (file_result["file"], line)
+    
+    report = {"passed": True, "files": [], "errors": []}
+    for index, file_result in enumerate(file_results):
+        if index == len(processing_queue_terms):
+            print("-"*80)
+        if file_result["errors"]:
+            report["passed"] = False
+            print(f"[FAIL] QC of {file_result['file']} - Lines: {file_result['lines']}; Errors: {len(file_result['errors'])}")
+        else:
+            print(f"[PASS] QC of {file_result['file']} - Lines: {file_result['lines']}")
+        report["files"].append({"file": file_result["file"], "kind": file_result["kind"], "lines": file_result["lines"], "errors": len(file_result["errors"])})
+        report["errors"].extend(file_result["errors"])
+    
+    if report_file is not None:
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    
+    if not report["passed"]:
+        print("-"*80)
+        for error in report["errors"]:
+            print(f"[Error] {error['message']}; line {error['line']}")
+        print(f"[ALERT] Pre-merge quality check found {len(report['errors'])} errors" + (f", see {report_file.name}" if report_file is not None else ""))
+        quit()
+    return report
 
-def update_master_registered_terms_file(term_file, output_file) -> None:
+def load_terms_file(term_file) -> list:
     term_data = []
     with open(term_file, 'r', encoding='utf-8') as f:
         for line in f:
             line = line.strip()
             if line:
                 term_data.append(json.loads(line))
+    return term_data
 
-    with open(output_file, 'r', encoding='utf-8') as f:
-            try:
-                output_data = json.load(f)
-                output_data = output_data if isinstance(output_data, list) else []
-                print("-"*80)
-            except:
-                output_data = []
-                print("\n" + "="*80)
-                print("Initializing registered terms file...\n" + "-"*80)
-
-    print(f"Loaded {len(term_data)} terms from {term_file.parent.name}/{term_file.name}...")
-    term_uuid_to_index = {}
-    try:
-        for i, entry in enumerate(output_data):
-            term_uuid = entry.get("term_uuid")
-            if term_uuid:
-                term_uuid_to_index[term_uuid] = i
-    except Exception as e:
-        term_uuid_to_index = {}
-        print(f"[ERROR] {e}")
+def merge_terms_into_registry(term_data, output_data, term_uuid_to_index) -> tuple:
+    """Merges entries of one terms.jsonl into the in-memory registry (output_data) and keeps term_uuid_to_index in sync.
+    Returns (skipped, updated, created) counts."""
 
     # Process each term from terms.jsonl
     updated_count, new_count, skipped_count = 0, 0, 0
@@ -242,61 +283,236 @@ def update_master_registered_terms_file(term_file, output_file) -> None:
             new_count += 1
             #print(f"Added new entry for '{term}' (UUID: {term_uuid[:8]}...)")
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+    return skipped_count, updated_count, new_count
 
+def print_merge_counts(skipped_count, updated_count, new_count, total_count) -> None:
     print(f"- Entries skipped: {skipped_count}")
     print(f"- Entries updated: {updated_count}")
     print(f"- Entries created: {new_count}")
 
-    print(f"- Total entries in master file: {len(output_data)} (+{new_count})")
+    print(f"- Total entries in master file: {total_count} (+{new_count})")
+    return None
+
+def merge_master_registered_terms_files(processing_queue_terms, output_file, term_contributions=None) -> list:
+    """Merges every terms.jsonl in the processing queue into one in-memory registry and writes the master nodes file once.
+    Cached per-source contributions (see load_term_contributions) are used instead of re-reading the raw file.
+    Returns the merged nodes."""
+    print("\n" + "="*80)
+    print("Initializing registered terms file...")
+    output_data = []
+    term_uuid_to_index = {}
+    for term_file in processing_queue_terms:
+        print("-"*80)
+        if term_contributions and term_file in term_contributions:
+            term_data = term_contributions[term_file]["terms"]
+        else:
+            term_data = load_terms_file(term_file)
+        print(f"Loaded {len(term_data)} terms from {term_file.parent.name}/{term_file.name}...")
+
+        skipped_count, updated_count, new_count = merge_terms_into_registry(term_data, output_data, term_uuid_to_index)
+        print_merge_counts(skipped_count, updated_count, new_count, len(output_data))
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(output_data, f, indent=2, ensure_ascii=False)
+    
+    return output_data
+
+
+def hash_file(file_path) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def hash_files(file_paths) -> str:
+    """Combined hash of several files, e.g. the pipeline modules, so code changes invalidate the build manifest."""
+    sha256 = hashlib.sha256()
+    for file_path in file_paths:
+        sha256.update(f"{file_path.name}:{hash_file(file_path)}\n".encode("utf-8"))
+    return sha256.hexdigest()
+
+def output_kinds(outputs) -> list:
+    """Timestamp-free (name, suffix) of each output file name, e.g. "dictionary_20250101_120000.sqlite" -> ("dictionary", ".sqlite")."""
+    return [(Path(output).stem.rsplit("_", 2)[0], Path(output).suffix) for output in outputs]
+
+def expected_output_kinds(config) -> list:
+    """Output files a build with the given output settings produces, as (name, suffix) pairs."""
+    kinds = [("master_nodes", ".json"), ("master_edges", ".json"), ("dictionary", f".{config['output_format']}")]
+    if config["sqlite_export"]:
+        kinds.append(("dictionary", ".sqlite"))
+    if config["mmap_index_export"]:
+        kinds.append(("dictionary", ".gsdidx"))
+    return kinds
+
+def source_key(file_path) -> str:
+    return f"{file_path.parent.name}/{file_path.name}"
+
+def load_build_manifest(manifest_file) -> dict:
+    """Loads the manifest of the previous build; returns an empty manifest if missing, unreadable or outdated."""
+    empty_manifest = {"version": MANIFEST_VERSION, "sources": {}, "outputs": [], "config": {}}
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return empty_manifest
+    if manifest.get("version") != MANIFEST_VERSION:
+        print(f"- Build manifest version changed, rebuilding all sources")
+        return empty_manifest
+    return manifest
+
+def find_changed_sources(processing_queue_terms, processing_queue_edges, manifest) -> tuple:
+    """Hashes every raw terms/edges file and compares against the manifest.
+    Returns ({source_key: sha256}, [changed source keys]); removed sources are reported as changed."""
+    print("\n" + "="*80 + "\nChecking raw sources against build manifest...")
+    file_hashes = {}
+    changed_sources = []
+    for source_file in processing_queue_terms + processing_queue_edges:
+        key = source_key(source_file)
+        file_hashes[key] = hash_file(source_file)
+        if manifest["sources"].get(key, {}).get("sha256") != file_hashes[key]:
+            changed_sources.append(key)
+    for key in manifest["sources"]:
+        if key not in file_hashes:
+            changed_sources.append(key)
     
+    if changed_sources:
+        print(f"- Changed sources: {', '.join(changed_sources)}")
+    else:
+        print("- No changed sources")
+    return file_hashes, changed_sources
+
+def load_term_contributions(processing_queue_terms, file_hashes, manifest, CACHE_DIR) -> dict:
+    """Returns {term_file: {"terms": [...], "source_metadata": {src_uuid: SourceContent}}} for every terms file.
+    Unchanged sources are read from the per-source cache; changed ones are parsed, enriched and re-cached."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    term_contributions = {}
+    for term_file in processing_queue_terms:
+        key = source_key(term_file)
+        cache_file = CACHE_DIR / f"{term_file.parent.name}_{term_file.stem}.json"
+        if manifest["sources"].get(key, {}).get("sha256") == file_hashes[key] and cache_file.exists():
+            with open(cache_file, "r", encoding="utf-8") as f:
+                term_contributions[term_file] = json.load(f)
+            print(f"- Reused cached contribution of {key}")
+            continue
+        
+        term_data = load_terms_file(term_file)
+        source_metadata = {}
+        for entry in term_data:
+            src_uuid = entry.get("src_uuid")
+            if src_uuid not in source_metadata:
+                source_metadata[src_uuid] = build_source_content(dict(entry.get("metadata", {})))
+        term_contributions[term_file] = {"terms": term_data, "source_metadata": source_metadata}
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump(term_contributions[term_file], f, ensure_ascii=False)
+        print(f"- Rebuilt contribution of {key}")
+    return term_contributions
+
+def merge_source_metadata_indexes(term_contributions) -> dict:
+    """Combines the cached per-source metadata in processing order; the first entry seen for a src_uuid wins."""
+    source_metadata_index = {}
+    for contribution in term_contributions.values():
+        for src_uuid, source_content in contribution["source_metadata"].items():
+            source_metadata_index.setdefault(src_uuid, source_content)
+    return source_metadata_index
+
+def save_build_manifest(manifest_file, file_hashes, term_contributions, processing_queue_edges, outputs, config=None) -> None:
+    """Records per-file content hashes, each source's contribution to nodes and edges, the generated outputs
+    and the output settings/code hash they were built with."""
+    sources = {}
+    for term_file, contribution in term_contributions.items():
+        term_uuids = sorted({entry["term_uuid"] for entry in contribution["terms"] if entry.get("term", "").strip() != "[DISCARD]"})
+        sources[source_key(term_file)] = {
+            "sha256": file_hashes[source_key(term_file)],
+            "terms": len(contribution["terms"]),
+            "term_uuids": term_uuids,
+        }
+    for edge_file in processing_queue_edges:
+        with open(edge_file, "r", encoding="utf-8") as f:
+            edge_count = sum(1 for line in f if line.strip())
+        sources[source_key(edge_file)] = {
+            "sha256": file_hashes[source_key(edge_file)],
+            "edges": edge_count,
+        }
+    
+    manifest = {"version": MANIFEST_VERSION, "sources": sources, "outputs": [output.name for output in outputs], "config": config or {}}
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    print(f"- Saved build manifest to {manifest_file.parent.name}/{manifest_file.name}")
     return None
 
-def post_merge_quality_check(output_file) -> None:
+def post_merge_quality_check(output_file, report_file=None) -> dict:
+    """Reports duplicate labels, duplicate gsd_id and near-duplicate labels in the master nodes file.
+    All lookups go through inverted indexes built in one pass; the report is also written as JSON if report_file is given."""
     print("\n" + "="*80 + "\nRunning post-merge quality check...")
     with open(output_file, "r") as f:
-        # Check for duplicates in term and gsd_id in metadata
         json_data = json.load(f)
-        term_set = set()
-        gsd_id_set = set()
-        duplicate_terms = set()
-        duplicate_gsd_ids = set()
-        
-        for entry in json_data:
-            term = entry.get("lbl", "").strip()
-            gsd_id = entry.get("gsd_id", "").strip()
-            if term:
-                if term in term_set:
-                    duplicate_terms.add(term)
-                else:
-                    term_set.add(term)
-            if gsd_id:
-                if gsd_id in gsd_id_set:
-                    duplicate_gsd_ids.add(gsd_id)
-                else:
-                    gsd_id_set.add(gsd_id)
-
-        if duplicate_terms:
-            print(f"[ALERT] Found {len(duplicate_terms)} duplicate terms in master nodes file:")
-            for term in duplicate_terms:
-                print(f"- {term}")
-                dup_entries = [entry for entry in json_data if entry.get("lbl", "").strip() == term]
-                for entry in dup_entries:
-                    print(f"   - {entry['term_uuid']}")
-                    print(f"     Sources: {', '.join([src.get('src', '') for src in entry['sources']])} ({', '.join([src.get('src_uuid', '') for src in entry['sources']])})")
-        else:
-            print("[PASS] No duplicate terms found in master_registered_terms.json")
-        
-        if duplicate_gsd_ids:
-            print(f"[ALERT] Found {len(duplicate_gsd_ids)} duplicate gsd_id in master nodes file:")
-            for gsd_id in duplicate_gsd_ids:
-                src_uuids = [src.get("src_uuid", "") for entry in json_data if entry.get("gsd_id", "").strip() == gsd_id for src in entry.get("sources", [])]
-                print(f"- {gsd_id} ({', '.join(src_uuids)})")
-        else:
-            print("[PASS] No duplicate gsd_id found in master nodes file")
+    
+    # Inverted indexes: label -> nodes, gsd_id -> nodes, normalized label -> nodes
+    label_index = {}
+    gsd_id_index = {}
+    normalized_label_index = {}
+    for entry in json_data:
+        term = entry.get("lbl", "").strip()
+        gsd_id = entry.get("gsd_id", "").strip()
+        if term:
+            label_index.setdefault(term, []).append(entry)
+            normalized_label_index.setdefault(normalize_label(term), []).append(entry)
+        if gsd_id:
+            gsd_id_index.setdefault(gsd_id, []).append(entry)
+    
+    duplicate_terms = {term: entries for term, entries in label_index.items() if len(entries) > 1}
+    duplicate_gsd_ids = {gsd_id: entries for gsd_id, entries in gsd_id_index.items() if len(entries) > 1}
+    near_duplicate_labels = {key: entries for key, entries in normalized_label_index.items() if len({entry["lbl"].strip() for entry in entries}) > 1}
+    
+    report = {
+        "duplicate_terms": [
+            {"lbl": term, "nodes": [{"term_uuid": entry["term_uuid"], "sources": entry.get("sources", [])} for entry in entries]}
+            for term, entries in duplicate_terms.items()
+        ],
+        "duplicate_gsd_ids": [
+            {"gsd_id": gsd_id, "term_uuids": [entry["term_uuid"] for entry in entries], "src_uuids": [src.get("src_uuid", "") for entry in entries for src in entry.get("sources", [])]}
+            for gsd_id, entries in duplicate_gsd_ids.items()
+        ],
+        "near_duplicate_labels": [
+            {"normalized_lbl": key, "nodes": [{"lbl": entry["lbl"], "term_uuid": entry["term_uuid"]} for entry in entries]}
+            for key, entries in near_duplicate_labels.items()
+        ],
+    }
+
+    if duplicate_terms:
+        print(f"[ALERT] Found {len(duplicate_terms)} duplicate terms in master nodes file:")
+        for term, dup_entries in duplicate_terms.items():
+            print(f"- {term}")
+            for entry in dup_entries:
+                print(f"   - {entry['term_uuid']}")
+                print(f"     Sources: {', '.join([src.get('src', '') for src in entry['sources']])} ({', '.join([src.get('src_uuid', '') for src in entry['sources']])})")
+    else:
+        print("[PASS] No duplicate terms found in master_registered_terms.json")
+    
+    if duplicate_gsd_ids:
+        print(f"[ALERT] Found {len(duplicate_gsd_ids)} duplicate gsd_id in master nodes file:")
+        for duplicate in report["duplicate_gsd_ids"]:
+            print(f"- {duplicate['gsd_id']} ({', '.join(duplicate['src_uuids'])})")
+    else:
+        print("[PASS] No duplicate gsd_id found in master nodes file")
+    
+    if near_duplicate_labels:
+        print(f"[ALERT] Found {len(near_duplicate_labels)} near-duplicate labels in master nodes file:")
+        for key, entries in near_duplicate_labels.items():
+            print(f"- {' | '.join(sorted({entry['lbl'].strip() for entry in entries}))}")
+            for entry in entries:
+                print(f"   - {entry['lbl']} ({entry['term_uuid']})")
+    else:
+        print("[PASS] No near-duplicate labels found in master nodes file")
+    
+    if report_file is not None:
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"- Saved post-merge report to {report_file.name}")
+    return report
 
-def update_master_registered_edges_file(edge_file, output_file) -> None:
+def load_edges_file(edge_file) -> list:
     edge_data = []
     with open(edge_file, 'r', encoding='utf-8') as f:
         for index, line in enumerate(f):
@@ -305,40 +521,18 @@ def update_master_registered_edges_file(edge_file, output_file) -> None:
                 edge_data.append(line)
             except json.JSONDecodeError:
                 print(f"[Error] Error decoding JSON on line {index + 1} of {edge_file.parent.name}/{edge_file.name}. Skipping this line.")
+    return edge_data
 
-    with open(output_file, 'r', encoding='utf-8') as f:
-            try:
-                output_data = json.load(f)
-                output_data = output_data if isinstance(output_data, list) else []
-                print("-"*80)
-            except:
-                output_data = []
-                print("\n" + "="*80)
-                print("Initializing registered edges file...\n" + "-"*80)
-
-    print(f"Loaded {len(edge_data)} edges from {edge_file.parent.name}/{edge_file.name}...")
-
+def merge_edges_into_registry(edge_data, output_data, edge_index) -> tuple:
+    """Merges edges of one edges.jsonl into the in-memory registry (output_data), keyed on (subj, pred, obj).
+    Merged edges accumulate every contributing xref and distinct comment, both as lists; comments are joined
+    with "; " only when the master file is written. Returns (skipped, merged, created) counts."""
     skipped, merged, created = 0, 0, 0
-    
-    relations_list = []
-    try:
-        for entry in output_data:
-            subj = entry.get("subj")
-            pred = entry.get("pred")
-            obj = entry.get("obj")
-            query_key = subj + pred + obj
-
-            if query_key:
-                relations_list.append((query_key))
-    except Exception as e:
-        relations_list = []
-        print(f"[ERROR] {e}")
-        
     for edge in edge_data:
         subj = edge.get("subj", "").strip()
         pred = edge.get("pred", "").strip()
         obj = edge.get("obj", "").strip()      
-        candidate_key = subj + pred + obj
+        candidate_key = (subj, pred, obj)
         
         xref = edge.get("xref", "").strip()
         comment = edge.get("comment", "").strip()
@@ -346,28 +540,130 @@ def update_master_registered_edges_file(edge_file, output_file) -> None:
             skipped += 1
             continue
         
-        if candidate_key not in relations_list:
+        if candidate_key not in edge_index:
             created += 1
             new_entry = {
                 "subj": subj,
                 "pred": pred,
                 "obj": obj,
-                "comment": comment  
+                "comment": [comment] if comment else [],
+                "xref": [xref] if xref else []
             }
             output_data.append(new_entry)
+            edge_index[candidate_key] = new_entry
         else:
             merged += 1
-    
+            existing_entry = edge_index[candidate_key]
+            if xref and xref not in existing_entry["xref"]:
+                existing_entry["xref"].append(xref)
+            if comment and comment not in existing_entry["comment"]:
+                existing_entry["comment"].append(comment)
+    return skipped, merged, created
+
+def print_edge_merge_counts(skipped, merged, created, total_count) -> None:
     print(f"- Entries skipped: {skipped}")
     print(f"- Entries merged: {merged}")
     print(f"- Entries created: {created}")
-    print(f"- Total edges in master file: {len(output_data)} (+{created})")
-        
+    print(f"- Total edges in master file: {total_count} (+{created})")
+    return None
+
+def merge_master_registered_edges_files(processing_queue_edges, output_file) -> list:
+    """Merges every edges.jsonl in the processing queue into one in-memory edge store and writes the master edges file once.
+    Returns the merged edges."""
+    print("\n" + "="*80)
+    print("Initializing registered edges file...")
+    output_data = []
+    edge_index = {}
+    for edge_file in processing_queue_edges:
+        print("-"*80)
+        edge_data = load_edges_file(edge_file)
+        print(f"Loaded {len(edge_data)} edges from {edge_file.parent.name}/{edge_file.name}...")
+
+        skipped, merged, created = merge_edges_into_registry(edge_data, output_data, edge_index)
+        print_edge_merge_counts(skipped, merged, created, len(output_data))
+
+    for edge in output_data:
+        edge["comment"] = "; ".join(edge["comment"])
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(output_data, f, indent=2, ensure_ascii=False)
-    return None
+    return output_data
 
-def build_ontology(nodes_file, edges_file, output_file, processing_queue_terms) -> None:
+def flatten_list(data):
+    if not isinstance(data, list):
+        return data
+    result = []
+    for item in data:
+        if isinstance(item, list):
+            result.extend(flatten_list(item))
+        else:
+            result.append(item)
+    return result
+
+def build_source_content(metadata) -> dict:
+    """Builds the SourceContent payload from the metadata block of a raw terms.jsonl entry.
+    related_synonyms is left empty here; it depends on the edges and is filled in by build_ontology."""
+    # Flatten any nested lists in metadata
+    for key, value in metadata.items():
+        if isinstance(value, list):
+            metadata[key] = flatten_list(value)
+    
+    source_content = {
+        "gsd_id": metadata.get("gsd_id"),
+        "gtc_id": metadata.get("gtc_id"),
+        "exact_synonyms": metadata.get("exact_synonyms"),
+        "related_synonyms": [],
+        "classification": metadata.get("classification"),
+        "definition": metadata.get("definition"),
+        "description": metadata.get("description"),
+        "evidence": metadata.get("evidence"),
+        "publication": metadata.get("publication"),
+        "db_xref": metadata.get("db_xref"),
+        "iupac_condensed": metadata.get("iupac_condensed"),
+    }
+    
+    # Handle function field (list of objects with src and content)
+    if metadata.get("function"):
+        functions = metadata["function"]
+        if isinstance(functions, list):
+            source_content["function"] = [
+                {"src": f.get("src", ""), "content": f.get("content", "")}
+                if isinstance(f, dict) else {"src": "", "content": str(f)}
+                for f in functions
+            ]
+    
+    # Handle disease_association field
+    if metadata.get("disease_association"):
+        diseases = metadata["disease_association"]
+        if isinstance(diseases, list):
+            source_content["disease_association"] = [
+                {"src": d.get("src", ""), "content": d.get("content", "")}
+                if isinstance(d, dict) else {"src": "", "content": str(d)}
+                for d in diseases
+            ]
+    
+    return source_content
+
+def build_source_metadata_index(processing_queue_terms) -> dict:
+    """Maps src_uuid -> SourceContent payload in a single streaming pass over the raw terms.jsonl files.
+    Files are read in processing order; the first entry seen for a src_uuid wins."""
+    source_metadata_index = {}
+    for terms_file in processing_queue_terms:
+        try:
+            with open(terms_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    src_uuid = entry.get("src_uuid")
+                    if src_uuid in source_metadata_index:
+                        continue
+                    source_metadata_index[src_uuid] = build_source_content(entry.get("metadata", {}))
+        except Exception as e:
+            print(f"Warning: Error reading {terms_file}: {e}")
+            continue
+    return source_metadata_index
+
+def build_ontology(nodes_file, edges_file, output_file, processing_queue_terms, source_metadata_index=None, output_format="json") -> None:
+    """Builds the dictionary from the master nodes/edges files.
+    output_format "json" writes {"nodes", "edges"} with indent=2; "ndjson" streams one record per line (see dictionary_io)."""
     print("\n" + "="*80)
     print("Building glycan structure dictionary...")
     
@@ -410,78 +706,21 @@ def build_ontology(nodes_file, edges_file, output_file, processing_queue_terms)
     
     print(f"Built bidirectional related_synonyms map for {len(related_synonyms_map)} terms")
     
-    # Helper function
-    def flatten_list(data):
-        if not isinstance(data, list):
-            return data
-        result = []
-        for item in data:
-            if isinstance(item, list):
-                result.extend(flatten_list(item))
-            else:
-                result.append(item)
-        return result
+    # Index raw source metadata once instead of rescanning every terms file per source
+    if source_metadata_index is None:
+        source_metadata_index = build_source_metadata_index(processing_queue_terms)
+    print(f"Indexed metadata for {len(source_metadata_index)} sources")
     
-    # Helper function: get metadata from raw JSONL files
     def get_source_metadata(src_uuid, term_uuid):
-        # Search through all raw term files
-        for terms_file in processing_queue_terms:
-            try:
-                with open(terms_file, "r", encoding="utf-8") as f:
-                    for line in f:
-                        entry = json.loads(line)
-                        if entry.get("src_uuid") == src_uuid:
-                            metadata = entry.get("metadata", {})
-                            
-                            # Flatten any nested lists in metadata
-                            for key, value in metadata.items():
-                                if isinstance(value, list):
-                                    metadata[key] = flatten_list(value)
-                            
-                            # Build SourceContent structure
-                            source_content = {
-                                "gsd_id": metadata.get("gsd_id"),
-                                "gtc_id": metadata.get("gtc_id"),
-                                "exact_synonyms": metadata.get("exact_synonyms"),
-                                "related_synonyms": related_synonyms_map.get(term_uuid, []),
-                                "classification": metadata.get("classification"),
-                                "definition": metadata.get("definition"),
-                                "description": metadata.get("description"),
-                                "evidence": metadata.get("evidence"),
-                                "publication": metadata.get("publication"),
-                                "db_xref": metadata.get("db_xref"),
-                                "iupac_condensed": metadata.get("iupac_condensed"),
-                            }
-                            
-                            # Handle function field (list of objects with src and content)
-                            if metadata.get("function"):
-                                functions = metadata["function"]
-                                if isinstance(functions, list):
-                                    source_content["function"] = [
-                                        {"src": f.get("src", ""), "content": f.get("content", "")}
-                                        if isinstance(f, dict) else {"src": "", "content": str(f)}
-                                        for f in functions
-                                    ]
-                            
-                            # Handle disease_association field
-                            if metadata.get("disease_association"):
-                                diseases = metadata["disease_association"]
-                                if isinstance(diseases, list):
-                                    source_content["disease_association"] = [
-                                        {"src": d.get("src", ""), "content": d.get("content", "")}
-                                        if isinstance(d, dict) else {"src": "", "content": str(d)}
-                                        for d in diseases
-                                    ]
-                            
-                            return source_content
-            except Exception as e:
-                print(f"Warning: Error reading {terms_file}: {e}")
-                continue
-        return {}
+        source_content = source_metadata_index.get(src_uuid)
+        if source_content is None:
+            return {}
+        source_content = dict(source_content)
+        source_content["related_synonyms"] = related_synonyms_map.get(term_uuid, [])
+        return source_content
     
     # Build nodes with enhanced source metadata
-    enhanced_nodes = []
-    for node in master_nodes:
+    def enhance_node(node):
         term_uuid = node.get("term_uuid")
         enhanced_sources = []
         for source in node.get("sources", []):
@@ -499,29 +738,39 @@ def build_ontology(nodes_file, edges_file, output_file, processing_queue_terms)
             "term_uuid": term_uuid,
             "sources": enhanced_sources
         }
-        enhanced_nodes.append(enhanced_node)
+        return enhanced_node
     
     # Build edges
-    formatted_edges = []
-    for edge in master_edges:
+    def format_edge(edge):
         formatted_edge = {
             "subj": edge.get("subj"),
             "pred": edge.get("pred"),
             "obj": edge.get("obj"),
-            "comment": edge.get("comment")
+            "comment": edge.get("comment"),
+            "xref": edge.get("xref", [])
         }
-        formatted_edges.append(formatted_edge)
+        return formatted_edge
     
-    # Build final GSD structure
-    gsd = {
-        "nodes": enhanced_nodes,
-        "edges": formatted_edges
-    }
-    
-    # Write to dictionary.json
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(gsd, f, indent=2, ensure_ascii=False)
+    if output_format == "ndjson":
+        # Stream one record per line; enhanced nodes are never held in memory all at once
+        write_dictionary_ndjson(
+            output_file,
+            (enhance_node(node) for node in master_nodes),
+            (format_edge(edge) for edge in master_edges),
+            len(master_nodes),
+            len(master_edges)
+        )
+    else:
+        # Build final GSD structure
+        gsd = {
+            "nodes": [enhance_node(node) for node in master_nodes],
+            "edges": [format_edge(edge) for edge in master_edges]
+        }
+        
+        # Write to dictionary.json
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(gsd, f, indent=2, ensure_ascii=False)
     
-    print(f"[COMPLETED] Successfully created dictionary.json with {len(enhanced_nodes)} nodes and {len(formatted_edges)} edges")
+    print(f"[COMPLETED] Successfully created {output_file.name} with {len(master_nodes)} nodes and {len(master_edges)} edges")
     print(f"            Output: {output_file.parent.name}/{output_file.name}")
-    print("="*80)
\ No newline at end of file
+    print("="*80)
@@ -0,0 +1,16 @@
+# Label normalization shared by the dictionary build (QC, SQLite/mmap lookups) and the AI mapping agents
+import re
+import unicodedata
+
+GREEK_TO_LATIN = str.maketrans({"α": "a", "β": "b", "γ": "g", "δ": "d", "ε": "e", "κ": "k", "λ": "l", "ω": "o"})
+# Spelled-out Greek letters as whole tokens, also inside linkage tokens ("Galalpha1-3Gal"), but not word prefixes ("betaine")
+GREEK_NAMES = re.compile(r"(alpha|beta|gamma|delta|epsilon|kappa|lambda|omega)(?![a-z])")
+# Whitespace, hyphens/dashes, underscores, and the commas and arrows of linkage positions ("1,2" / "1-2" / "1→2")
+LABEL_SEPARATORS = re.compile(r"[\s\-‐‑‒–—_,→]+")
+
+def normalize_label(label) -> str:
+    """Normalization key for near-duplicate labels: ignores case, separators (whitespace, hyphens, linkage commas)
+    and Greek vs Latin spelling (α/alpha/a)."""
+    label = unicodedata.normalize("NFKC", label).lower().translate(GREEK_TO_LATIN)
+    label = GREEK_NAMES.sub(lambda m: m.group(1)[0], label)
+    return LABEL_SEPARATORS.sub("", label)
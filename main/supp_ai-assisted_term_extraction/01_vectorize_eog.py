@@ -1,7 +1,9 @@
-from uuid import uuid4
+from uuid import NAMESPACE_URL, uuid5
 import os
 import json
 import glob
+import hashlib
+import sys
 from pathlib import Path
 
 from langchain_core.documents import Document
@@ -9,7 +11,10 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-#quit() # Stop: this script is only meant to be run once - to create the vector store.
+sys.path.append(str(Path(__file__).parents[1] / "1_ai-assisted_term_matching"))
+from embedding_cache import CachedEmbeddings
+
+# Re-runs only re-split, re-embed and upsert chapters whose raw text changed (see eog_chunks_manifest.json).
 
 DATA_DIR = Path(__file__).parents[2] / "data" / "supp"
 
@@ -17,25 +22,57 @@ DATA_DIR = Path(__file__).parents[2] / "data" / "supp"
 persist_directory = DATA_DIR / "vector_store"
 
 input_directory = DATA_DIR / "essentials_of_glycobiology" / "raw_txt"
+jsonl_path = DATA_DIR / "eog_chunks.jsonl"
+manifest_path = DATA_DIR / "eog_chunks_manifest.json" # {chapter: {"sha256": file hash, "chunk_ids": [...]}}
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+BATCH_SIZE = 500 # Chunks per upsert/delete call
+
+# Shared with the term matching vector store; unchanged chunks are not re-embedded on rebuild
+embedding_cache_file = Path(__file__).parents[2] / "data" / "cache" / "embedding_cache.sqlite"
+embeddings = CachedEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small"), embedding_cache_file)
 
 chapter_files = sorted(glob.glob(str(input_directory / "ch*.txt")))
 if not chapter_files:
     raise FileNotFoundError(f"No chapter files found in {input_directory}")
 
+def chunk_id(chapter, offset, text) -> str:
+    """Deterministic chunk id from chapter, character offset and text hash; stays a UUID for downstream evidence fields."""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid5(NAMESPACE_URL, f"eog:{chapter}:{offset}:{text_hash}"))
+
+manifest = {}
+if manifest_path.exists():
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+# Chunks of unchanged chapters are reused from the previous eog_chunks.jsonl
+previous_chunks = {}
+if manifest and jsonl_path.exists():
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            previous_chunks.setdefault(record["metadata"]["chapter"], []).append(record)
+
 raw_docs = []
+chapter_hashes = {}
+unchanged_chapters = []
 for fp in chapter_files:
     chapter_id = os.path.splitext(os.path.basename(fp))[0]
     with open(fp, "r", encoding="utf-8") as f:
         text = f.read()
+    chapter_hashes[chapter_id] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    previous = manifest.get(chapter_id, {})
+    if previous.get("sha256") == chapter_hashes[chapter_id] and len(previous_chunks.get(chapter_id, [])) == len(previous.get("chunk_ids", [])):
+        unchanged_chapters.append(chapter_id)
+        continue
     raw_docs.append(
         Document(
             page_content=text,
             metadata={"chapter": chapter_id}
         )
     )
-print(f"Loaded {len(raw_docs)} chapters.")
+removed_chapters = sorted(set(manifest) - set(chapter_hashes))
+print(f"Loaded {len(chapter_files)} chapters: {len(raw_docs)} new or changed, {len(unchanged_chapters)} unchanged, {len(removed_chapters)} removed.")
 
 #############################################################################
 
@@ -44,37 +81,63 @@ text_splitter = RecursiveCharacterTextSplitter(
     chunk_overlap=200,
     separators=["\n\n", "\n", ". ", ", ", " ", ""],
     keep_separator='end',
+    add_start_index=True,
 )
 
 chunks = text_splitter.split_documents(raw_docs)
-print(f"Split into {len(chunks)} chunks.")
+print(f"Split changed chapters into {len(chunks)} chunks.")
 
 for chunk in chunks:
-    chunk.metadata["id"] = str(uuid4())
-    
+    chunk.metadata["id"] = chunk_id(chunk.metadata["chapter"], chunk.metadata["start_index"], chunk.page_content)
+
 #print first 3 chunks
 for i, chunk in enumerate(chunks[:3]):
     print(f"Chunk {i+1}:\n{chunk.page_content}.\nMetadata: {chunk.metadata}\n")
 
 ##############################################################################
 
+# chapter -> records, in chapter order: reused records for unchanged chapters, fresh ones for changed chapters
+chapter_records = {chapter: previous_chunks[chapter] for chapter in unchanged_chapters}
+for chunk in chunks:
+    chapter_records.setdefault(chunk.metadata["chapter"], []).append({
+        "content": chunk.page_content,
+        "metadata": chunk.metadata,
+    })
+
 os.makedirs(persist_directory, exist_ok=True)
-jsonl_path = DATA_DIR / "eog_chunks.jsonl"
+n_chunks = 0
 with open(jsonl_path, "w", encoding="utf-8") as f:
-    for chunk in chunks:
-        record = {
-            "content": chunk.page_content,
-            "metadata": chunk.metadata,
-        }
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
-        
-print(f"Saved {len(chunks)} chunks to {jsonl_path}.")
+    for chapter in sorted(chapter_records):
+        for record in chapter_records[chapter]:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            n_chunks += 1
+
+print(f"Saved {n_chunks} chunks to {jsonl_path}.")
 
 ##############################################################################
 
-vector_store = Chroma.from_documents(
+vector_store = Chroma(
     collection_name="essentials_of_glycobiology",
-    embedding=embeddings,
-    persist_directory=persist_directory,
-    documents=chunks,
-)
\ No newline at end of file
+    embedding_function=embeddings,
+    persist_directory=str(persist_directory),
+)
+
+# Upsert chunks of changed chapters; ids are deterministic, so unchanged chunks overwrite themselves
+for i in range(0, len(chunks), BATCH_SIZE):
+    batch = chunks[i:i + BATCH_SIZE]
+    vector_store.add_documents(documents=batch, ids=[chunk.metadata["id"] for chunk in batch])
+
+# Delete chunks that no longer exist (edited or removed chapters, and random-id chunks of older builds)
+current_ids = {record["metadata"]["id"] for records in chapter_records.values() for record in records}
+stale_ids = sorted(set(vector_store.get(include=[])["ids"]) - current_ids)
+for i in range(0, len(stale_ids), BATCH_SIZE):
+    vector_store.delete(ids=stale_ids[i:i + BATCH_SIZE])
+print(f"Upserted {len(chunks)} chunks, deleted {len(stale_ids)} stale chunks.")
+
+manifest = {
+    chapter: {"sha256": chapter_hashes[chapter], "chunk_ids": [record["metadata"]["id"] for record in chapter_records.get(chapter, [])]}
+    for chapter in sorted(chapter_hashes)
+}
+with open(manifest_path, "w", encoding="utf-8") as f:
+    json.dump(manifest, f, indent=2)
+print(f"Embedding cache: {embeddings.hits} hits, {embeddings.misses} misses")
@@ -1,7 +1,10 @@
-import json, os, re
-from gliner import GLiNER
+import json, os
 from pathlib import Path
 
+from utils_filter import StageTimer, is_excluded
+from utils_gliner import PredictionCache, predict_texts
+from utils_tagger import sentence_spans, enclosing_sentence
+
 DATA_DIR = Path(__file__).parents[2] / "data" / "supp"
 INPUT_JSONL   = DATA_DIR / "eog_chunks.jsonl"
 OUTPUT_JSONL  = DATA_DIR / "eog_raw_terms.jsonl"
@@ -13,71 +16,21 @@ MODEL         = "urchade/gliner_large-v2.1"
 GLINER_LABELS = ["glycan structural class"]
 THRESHOLD     = 0.25   
 
-SENT_END = re.compile(r"(?<=\.)\s+")
-
-###################################################################################################
+NUM_WORKERS   = 4      # Worker processes, each with its own model copy (1 = in-process)
+BATCH_SIZE    = 8      # Chunks per GLiNER batch_predict_entities call
+THREADS_PER_WORKER = max(1, (os.cpu_count() or 1) // NUM_WORKERS)
 
-# Exclude non-glycan entities (proteins, enzymes, antibodies, MS peak labels, metrics)
-NON_GLYCAN_PATTERNS = [
-    re.compile(r"\bMUC\d+\b", re.I),
-    re.compile(r"\bgalectin-?\d*\b", re.I),
-    re.compile(r"\blectins?\b", re.I),
-    re.compile(r"\bintegrins?\b", re.I),
-    re.compile(r"\balbumin\b", re.I),
-    re.compile(r"\btransferrin\b", re.I),
-
-    re.compile(r"\b(?:IgG|IgA|IgM)\b", re.I),
-    re.compile(r"\bantibod(?:y|ies)\b", re.I),
-    re.compile(r"\banti[-–\s]?glycans?\b", re.I),
-
-    re.compile(r"\b[a-zA-Zβ-]*transferases?\b", re.I),
-    re.compile(r"\b[a-zA-Zβ-]*glycosidas(?:e|es)\b", re.I),
-    re.compile(r"\bhexosaminidas(?:e|es)\b", re.I),
-    re.compile(r"\bmannosidas(?:e|es)\b", re.I),
-
-    re.compile(r"\b(?:GlycA|M2BPGi)\b", re.I),
-    re.compile(r"\bGP\d{1,3}\b", re.I),
-    
-    re.compile(r"\b(?:UDP|GDP|CMP)-[A-Za-z0-9]+(?:Kdn|Xyl|Fuc|Man|Gal|Glc|GlcA|GlcNAc|GalNAc|Neu5Ac|Neu5Gc)?\b", re.I),
-    re.compile(r"\b[αβ][1-9]-[1-9]\b"),
-    re.compile(r"\b[αβ][1-9]→[1-9]\b"),
-    re.compile(r"\bC[1-9]{2}:[1-9]\b"),
-    re.compile(r"\b(?:multivalent|vertebrate|bacterial|plant|fungal|nonreducing|cell surface|synthetic)(?:[-\w]*)\b", re.I),
-    re.compile(r"\b(?:[-\w]*?)linkage\b", re.I)
-]
-
-# Exclude overly-generic words
-GENERIC_BAD = {
-    "glycan", "glycans", "carbohydrate", "carbohydrates", "monosaccharide", "monosaccharides",
-    "disaccharide", "disaccharides", "trisaccharide", "trisaccharides", "oligosaccharide", "oligosaccharides",
-    "polysaccharide", "polysaccharides", "glycosylation", "glycosylations", "glycoform", "glycoforms",
-    "glycoconjugate", "glycoconjugates", "glycoprotein", "glycoproteins", "glycosidic bond", "glycosidic bonds",
-    "glycolipid", "glycolipids", "glycan structure", "glycan structures",
-    "glycan motif", "glycan motifs", "glycan epitope", "glycan epitopes",
-    
-    "n-glycan", "n-glycans", "n-linked glycan", "n-linked glycans", "n-glycan structure", "n-glycan structures",
-    "o-glycan", "o-glycans", "o-linked glycan", "o-linked glycans", "o-glycan structure", "o-glycan structures",
-    "gag", "gags", "glycosaminoglycan", "glycosaminoglycans",
-    "proteoglycan", "proteoglycans", "peptidoglycan", "peptidoglycans",
-    
-    "gt", "gts", "gh", "ghs", "sialidase", "sialidases", "neuraminidase", "neuraminidases",
-    "ogt", "ogts", "oga", "ogas",
-    
-    "dol-p-man", "mannac-6-p",
-}
+PREDICTION_CACHE = True   # Cache raw predictions per chunk text, so THRESHOLD/filter changes replay without inference
+CACHE_THRESHOLD  = 0.05   # Threshold the cached predictions are made with; THRESHOLD is applied on replay
+CACHE_FILE       = Path(__file__).parents[2] / "data" / "cache" / "gliner_predictions.sqlite"
 
 ###################################################################################################
 
-model = GLiNER.from_pretrained(MODEL)
-
-# open files
-os.makedirs(os.path.dirname(OUTPUT_JSONL), exist_ok=True)
-out_f = open(OUTPUT_JSONL, "w", encoding="utf-8")
+timer = StageTimer()
 
-# iterate over the chosen slice of lines
-processed = 0
-hits = 0
-with open(INPUT_JSONL, "r", encoding="utf-8") as f:
+# read the chosen slice of lines: (lineno, text, chapter, uid)
+records = []
+with timer.stage("read"), open(INPUT_JSONL, "r", encoding="utf-8") as f:
     for lineno, line in enumerate(f, start=1):
         # skip until START_LINE, stop after END_LINE
         if lineno < START_LINE:
@@ -100,63 +53,65 @@ with open(INPUT_JSONL, "r", encoding="utf-8") as f:
 
         if not text:
             continue
+        records.append((lineno, text, chapter, uid))
+
+# predictions are made at the lower of the two thresholds; THRESHOLD is applied below
+prediction_threshold = min(THRESHOLD, CACHE_THRESHOLD) if PREDICTION_CACHE else THRESHOLD
+cache = PredictionCache(CACHE_FILE, MODEL, GLINER_LABELS, prediction_threshold) if PREDICTION_CACHE else None
+print(f"Running GLiNER on {len(records)} chunks in batches of {BATCH_SIZE} with {NUM_WORKERS} worker(s)")
+
+# open files
+os.makedirs(os.path.dirname(OUTPUT_JSONL), exist_ok=True)
+out_f = open(OUTPUT_JSONL, "w", encoding="utf-8")
+
+# batches come back in input order, so output stays in original line order
+processed = 0
+hits = 0
+results = predict_texts([text for _, text, _, _ in records], MODEL, GLINER_LABELS, prediction_threshold, BATCH_SIZE, NUM_WORKERS, THREADS_PER_WORKER, cache)
+for lineno, text, chapter, uid in records:
+    # GLiNER result (time spent waiting on the model)
+    with timer.stage("inference"):
+        entities, error = next(results)
+    if error is not None:
+        print(f"[WARN] GLiNER failed on line {lineno}: {error}")
+        continue
+
+    processed += 1
+    spans = None
+
+    # write filtered results
+    for ent in entities:
+        term = (ent.get("text") or "").strip()
+        if not term:
+            continue
 
-        # precompute sentence spans for extracting period-to-period sentence
-        spans = []
-        start_idx = 0
-        for m in SENT_END.finditer(text):
-            end_idx = m.start() + 1
-            spans.append((start_idx, end_idx))
-            start_idx = m.end()
-        if start_idx < len(text):
-            spans.append((start_idx, len(text)))
-
-        # run GLiNER
+        # positions and score
         try:
-            entities = model.predict_entities(text, GLINER_LABELS, threshold=THRESHOLD)
-        except Exception as e:
-            print(f"[WARN] GLiNER failed on line {lineno}: {e}")
+            start = int(ent.get("start", -1))
+            end = int(ent.get("end", -1))
+        except Exception:
             continue
+        if start < 0 or end <= start:
+            continue
+        score = float(ent.get("score", ent.get("confidence", 0.0)))
+        if score < THRESHOLD:
+            continue
+
+        # drop proteins/enzymes/antibodies/MS peaks/metrics, generic words and too-short terms
+        with timer.stage("filter"):
+            excluded = is_excluded(term)
+        if excluded:
+            continue
+
+        # extract sentence (period-to-period); spans are computed once per chunk, on its first kept entity
+        with timer.stage("sentence"):
+            if spans is None:
+                spans = sentence_spans(text)
+                span_starts = [s for s, _ in spans]
+            term_sentence = enclosing_sentence(text, spans, span_starts, start, end)
 
-        processed += 1
-
-        # write filtered results
-        for ent in entities:
-            term = (ent.get("text") or "").strip()
-            if not term:
-                continue
-
-            # positions and score
-            try:
-                start = int(ent.get("start", -1))
-                end = int(ent.get("end", -1))
-            except Exception:
-                continue
-            if start < 0 or end <= start:
-                continue
-            score = float(ent.get("score", ent.get("confidence", 0.0)))
-
-            # -------- apply exclusion filters --------
-            # drop proteins/enzymes/antibodies/MS peaks/metrics
-            if any(p.search(term) for p in NON_GLYCAN_PATTERNS):
-                continue
-            # drop generic words
-            if term.lower() in GENERIC_BAD or len(term) < 3:
-                continue
-            # -----------------------------------------
-
-            # extract sentence (period-to-period)
-            term_sentence = None
-            for s, e in spans:
-                if s <= start < e or s < end <= e or (start <= s and end >= e):
-                    term_sentence = text[s:e].strip()
-                    break
-            if term_sentence is None:
-                lo = max(0, start - 120)
-                hi = min(len(text), end + 120)
-                term_sentence = text[lo:hi].strip()
-
-            # write JSONL
+        # write JSONL
+        with timer.stage("write"):
             out = {
                 "term": term,
                 "start_pos": start,
@@ -166,12 +121,12 @@ with open(INPUT_JSONL, "r", encoding="utf-8") as f:
                 "metadata": {"chapter": chapter, "uuid": uid, "source_line": lineno}
             }
             out_f.write(json.dumps(out, ensure_ascii=False) + "\n")
-            hits += 1
+        hits += 1
 
-        if processed % 10 == 0:
-            print(f"Processed {processed} chunks (lines {START_LINE}..{lineno}), hits so far: {hits}")
+    if processed % 10 == 0:
+        print(f"Processed {processed} chunks (lines {START_LINE}..{lineno}), hits so far: {hits}")
 
 out_f.close()
 
 print(f"Done. Processed lines {START_LINE}..{END_LINE or 'EOF'}; wrote {hits} records to {OUTPUT_JSONL}")
-
+print("Stage timings:\n" + timer.report())
@@ -0,0 +1,50 @@
+# Tag known GSD terms in the EOG chunks with an Aho–Corasick automaton (no neural model)
+# Complements 02_gliner_eog.py: surface forms already in the dictionary are annotated in linear time.
+import json, sys, time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "2_generate_mappings"))
+from dictionary_io import iter_dictionary_nodes
+from utils_tagger import build_automaton, tag_text
+
+DATA_DIR = Path(__file__).parents[2] / "data" / "supp"
+PRC_DIR = Path(__file__).parents[2] / "data" / "processed"
+INPUT_JSONL   = DATA_DIR / "eog_chunks.jsonl"
+OUTPUT_JSONL  = DATA_DIR / "eog_dictionary_terms.jsonl"
+
+# Latest built dictionary (.json or .ndjson)
+dictionary_files = sorted(PRC_DIR.glob("dictionary_*.json")) + sorted(PRC_DIR.glob("dictionary_*.ndjson"))
+if not dictionary_files:
+    raise FileNotFoundError(f"No dictionary_*.json or dictionary_*.ndjson found in {PRC_DIR}; run postprocessing.py first")
+DICTIONARY_FILE = max(dictionary_files, key=lambda f: f.stat().st_mtime)
+
+automaton = build_automaton(iter_dictionary_nodes(DICTIONARY_FILE))
+
+processed = 0
+hits = 0
+chars = 0
+start_time = time.perf_counter()
+with open(INPUT_JSONL, "r", encoding="utf-8") as f, open(OUTPUT_JSONL, "w", encoding="utf-8") as out_f:
+    for lineno, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+        text = rec.get("content", "") or ""
+        meta = rec.get("metadata", {}) or {}
+        if not text:
+            continue
+
+        for out in tag_text(automaton, text):
+            out["metadata"] = {"chapter": meta.get("chapter"), "uuid": meta.get("uuid") or meta.get("id"), "source_line": lineno}
+            out_f.write(json.dumps(out, ensure_ascii=False) + "\n")
+            hits += 1
+        processed += 1
+        chars += len(text)
+
+elapsed = time.perf_counter() - start_time
+print(f"Done. Tagged {processed} chunks ({chars} characters) in {elapsed:.2f}s ({chars / max(elapsed, 1e-9) / 1e6:.2f}M chars/s) using {DICTIONARY_FILE.name}")
+print(f"Wrote {hits} records to {OUTPUT_JSONL}")
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from typing import List, Dict
@@ -6,8 +7,16 @@ from langchain_core.messages import SystemMessage, HumanMessage
 from dotenv import load_dotenv
 from pathlib import Path
 
+from utils_llm import RateLimiter, estimate_tokens, invoke_with_backoff, parse_jsonl_response
+
 load_dotenv()
 
+ASYNC_MODE = True           # Run batches concurrently under the rate limits below (False = serial llm.invoke)
+MAX_CONCURRENCY = 8         # Requests in flight
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 30000
+PARSE_RETRIES = 2           # Re-asks for a malformed batch before it is split in half
+
 # Initialize ChatOpenAI with GPT-4.1 (GPT-5 was not available yet)
 llm = ChatOpenAI(model="gpt-4.1", temperature=0)
 
@@ -21,8 +30,8 @@ def extract_term_and_first_sentence_term(line_data: dict) -> tuple:
     
     return term, first_sentence_term
 
-def process_batch_with_llm(batch_terms: List[str]) -> List[Dict[str, str]]:
-    """Process a batch of terms with ChatOpenAI to determine if they are glycan structures and normalize them."""
+def build_messages(batch_terms: List[str]) -> list:
+    """System and user messages asking the model to retain or remove each term of the batch."""
     
     system_prompt = """You are a glycobiology expert filtering glycan terms from JSONL data for the Glycan Structure Dictionary (GSD). The goal is to retain terms that directly specify a singular glycan's structure, composition, linkage pattern, biosynthetic class (N-, O-, glycolipid, polysaccharide, GPI), well-defined structural features (e.g., bisecting GlcNAc, core fucose), established motifs (e.g., Lewis antigens, CA markers), or precise modification steps (e.g., core-fucosylation, α2,3-sialylation). Retain only if the entire term is relevant and unambiguous; remove if entirely irrelevant (non-structural or vague). Use sentence context to disambiguate. Do not normalize, split, group, or classify yet.
 """
@@ -47,11 +56,16 @@ Output only JSONL lines, starting directly with {"""
 
     user_prompt = f"Instructions: {instructions}\nPlease analyze these terms:\n" + "\n".join([f"- {term}" for term in batch_terms])
 
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_prompt)
+    ]
+
+def process_batch_with_llm(batch_terms: List[str]) -> List[Dict[str, str]]:
+    """Process a batch of terms with ChatOpenAI to determine if they are glycan structures and normalize them."""
+
     try:
-        response = llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ])
+        response = llm.invoke(build_messages(batch_terms))
         
         # Parse the JSON response
         response_text = response.content.strip()
@@ -68,6 +82,48 @@ Output only JSONL lines, starting directly with {"""
         # Return default format if parsing fails
         return [{"original_term": term, "normalized_term": "ERROR"} for term in batch_terms]
 
+def check_batch_results(results: List[Dict[str, str]], batch_terms: List[str]) -> None:
+    """Raises ValueError unless there is exactly one decision per input term."""
+    if len(results) != len(batch_terms) or not all(isinstance(r, dict) and "original_term" in r and "decision" in r for r in results):
+        raise ValueError(f"Expected {len(batch_terms)} decisions, got {len(results)}")
+
+async def process_batch_async(batch_terms: List[str], limiter: RateLimiter) -> List[Dict[str, str]]:
+    """Async variant of process_batch_with_llm: malformed replies are re-asked, then the batch is split in half.
+    Other errors (auth/4xx, or 429/5xx after invoke_with_backoff gave up) return ERROR rows without splitting."""
+    messages = build_messages(batch_terms)
+    estimated_tokens = estimate_tokens(messages[0].content + messages[1].content) + 30 * len(batch_terms)
+    for attempt in range(PARSE_RETRIES + 1):
+        try:
+            response = await invoke_with_backoff(llm, messages, limiter, estimated_tokens)
+            results = parse_jsonl_response(response.content)
+            check_batch_results(results, batch_terms)
+            return results
+        except ValueError as e:
+            print(f"Malformed batch ({len(batch_terms)} terms, attempt {attempt + 1}): {e}")
+        except Exception as e:
+            print(f"Error processing batch: {e}")
+            return [{"original_term": term, "normalized_term": "ERROR"} for term in batch_terms]
+
+    if len(batch_terms) > 1:
+        middle = len(batch_terms) // 2
+        first, second = await asyncio.gather(
+            process_batch_async(batch_terms[:middle], limiter),
+            process_batch_async(batch_terms[middle:], limiter)
+        )
+        return first + second
+    return [{"original_term": term, "normalized_term": "ERROR"} for term in batch_terms]
+
+async def process_batches_async(batches: List[List[str]], output_file) -> int:
+    """Runs all batches concurrently under the rate limits and appends results in input order."""
+    limiter = RateLimiter(MAX_CONCURRENCY, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    tasks = [asyncio.create_task(process_batch_async(batch, limiter)) for batch in batches]
+    processed_count = 0
+    for batch, task in zip(batches, tasks):
+        append_to_output_file(await task, output_file)
+        processed_count += len(batch)
+        print(f"Processed {processed_count} terms so far...")
+    return processed_count
+
 def append_to_output_file(results: List[Dict[str, str]], output_file: str):
     """Append results to the output JSONL file, preserving Unicode (e.g., Greek letters)."""
     with open(output_file, 'a', encoding='utf-8') as f:
@@ -85,6 +141,21 @@ def main():
         os.remove(output_file)
     
     print(f"Processing {input_file} in batches of {batch_size}...")
+
+    if ASYNC_MODE:
+        terms = []
+        with open(input_file, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                try:
+                    term, first_sentence_term = extract_term_and_first_sentence_term(json.loads(line.strip()))
+                    terms.append(term)
+                except json.JSONDecodeError as e:
+                    print(f"Error parsing line {line_num}: {e}")
+        batches = [terms[i:i + batch_size] for i in range(0, len(terms), batch_size)]
+        processed_count = asyncio.run(process_batches_async(batches, output_file))
+        print(f"Complete! Processed {processed_count} terms.")
+        print(f"Results saved to {output_file}")
+        return
     
     with open(input_file, 'r', encoding='utf-8') as f:
         batch_terms = []
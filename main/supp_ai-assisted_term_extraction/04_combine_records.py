@@ -6,6 +6,8 @@ from langchain_core.messages import SystemMessage, HumanMessage
 from dotenv import load_dotenv
 from pathlib import Path
 
+from utils_llm import estimate_tokens
+
 # pip install chardet
 
 load_dotenv()
@@ -13,6 +15,79 @@ load_dotenv()
 # Initialize ChatOpenAI
 llm = ChatOpenAI(model="gpt-4.1", temperature=0)
 
+TOKEN_BUDGET = 6000             # Estimated prompt tokens per batch for terms + evidence (instructions excluded)
+MAX_TERMS_PER_BATCH = 12
+MAX_SENTENCES_PER_TERM = 8      # Unique evidence sentences kept per term
+PREFIX_LENGTH = 4               # Consecutive terms sharing this many leading characters are kept in one batch
+
+def term_evidence(data: Dict) -> List[tuple]:
+    """Unique (sentence, uuid) pairs of a term, in input order, capped at MAX_SENTENCES_PER_TERM.
+    Overlapping chunks yield the same sentence under several uuids; the first one is kept."""
+    evidence = []
+    seen = set()
+    for sent, meta in zip(data.get("term_in_sentence", []), data.get("metadata", [])):
+        if sent in seen:
+            continue
+        seen.add(sent)
+        evidence.append((sent, meta.get("uuid", "")))
+        if len(evidence) == MAX_SENTENCES_PER_TERM:
+            break
+    return evidence
+
+def sentence_line(label: str, sent: str, uuid: str) -> str:
+    return f'[{label}] "{sent}" (sentence uuid: "{uuid}")\n'
+
+def term_cost(data: Dict, evidence: List[tuple], batch_sentences: set) -> int:
+    """Estimated prompt tokens a term adds to a batch; sentences already in the batch are free."""
+    cost = estimate_tokens(f'Term 00: "{data.get("original_term", "")}"\nEvidence: ') + 3 * len(evidence)
+    for sent, uuid in evidence:
+        if sent not in batch_sentences:
+            cost += estimate_tokens(sentence_line("S000", sent, uuid))
+    return cost
+
+def lexical_groups(data_list: List[Dict]) -> List[List[Dict]]:
+    """Runs of consecutive terms that are equal or share the first PREFIX_LENGTH characters (case-insensitive)."""
+    groups = []
+    for data in data_list:
+        term = data["original_term"].lower()
+        if groups:
+            last_term = groups[-1][-1]["original_term"].lower()
+            if term[:PREFIX_LENGTH] == last_term[:PREFIX_LENGTH] or term == last_term:
+                groups[-1].append(data)
+                continue
+        groups.append([data])
+    return groups
+
+def pack_batches(data_list: List[Dict]) -> List[List[Dict]]:
+    """Packs terms into batches of up to TOKEN_BUDGET estimated tokens and MAX_TERMS_PER_BATCH terms.
+    A lexical group starts a new batch rather than being split, unless it does not fit in a batch on its own."""
+    batches = []
+    batch, batch_sentences, used = [], set(), 0
+    for group in lexical_groups(data_list):
+        group_evidence = [term_evidence(data) for data in group]
+
+        group_sentences = set()
+        group_cost = 0
+        for data, evidence in zip(group, group_evidence):
+            group_cost += term_cost(data, evidence, batch_sentences | group_sentences)
+            group_sentences.update(sent for sent, _ in evidence)
+        if batch and (used + group_cost > TOKEN_BUDGET or len(batch) + len(group) > MAX_TERMS_PER_BATCH):
+            batches.append(batch)
+            batch, batch_sentences, used = [], set(), 0
+
+        for data, evidence in zip(group, group_evidence):
+            cost = term_cost(data, evidence, batch_sentences)
+            if batch and (used + cost > TOKEN_BUDGET or len(batch) == MAX_TERMS_PER_BATCH):
+                batches.append(batch)
+                batch, batch_sentences, used = [], set(), 0
+                cost = term_cost(data, evidence, batch_sentences)
+            batch.append(data)
+            batch_sentences.update(sent for sent, _ in evidence)
+            used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
 def process_batch_with_llm(batch_data: List[Dict]) -> List[Dict[str, str]]:
     """Process a batch of terms with ChatOpenAI to group, split, normalize, and describe them."""
     
@@ -40,17 +115,22 @@ Output only valid normalized terms; no extras. If no valid terms, output {}. Sta
 
 """
 
+    # Each unique evidence sentence is listed once; terms refer to it by label
+    labels = {}
+    sentence_block = ""
+    term_block = ""
     for idx, data in enumerate(batch_data, 1):
         term = data.get("original_term", "")
-        sentences = data.get("term_in_sentence", [])
-        metadata = data.get("metadata", [])
-        
-        formatted_text += f'Term {idx}: "{term}"\n\nEvidence sentence(s):\n'
-        for sent, meta in zip(sentences, metadata):
-            uuid = meta.get("uuid", "")
-            formatted_text += f'"{sent}" (sentence uuid: "{uuid}")\n'
-        formatted_text += '\n\n'
-    
+        refs = []
+        for sent, uuid in term_evidence(data):
+            if sent not in labels:
+                labels[sent] = f"S{len(labels) + 1}"
+                sentence_block += sentence_line(labels[sent], sent, uuid)
+            refs.append(labels[sent])
+        term_block += f'Term {idx}: "{term}"\nEvidence: {", ".join(refs)}\n\n'
+
+    formatted_text += "Evidence sentences:\n" + sentence_block + "\n" + term_block
+
     user_prompt = formatted_text
     #print(user_prompt)
     #quit()
@@ -86,7 +166,7 @@ Output only valid normalized terms; no extras. If no valid terms, output {}. Sta
     except Exception as e:
         print(f"Error processing batch: {e}")
         # Return default format if parsing fails
-        return [{"normalized_term": data["term"], "description": "ERROR", "evidence": []} for data in batch_data]
+        return [{"normalized_term": data.get("original_term", ""), "description": "ERROR", "evidence": []} for data in batch_data]
 
 def append_to_output_file(results: List[Dict[str, str]], output_file: str):
     """Append results to the output JSONL file."""
@@ -115,34 +195,16 @@ def main():
                 print(f"Error parsing line {line_num}: {e}")
                 continue
     
+    batches = pack_batches(data_list)
+    print(f"Packed {len(data_list)} terms into {len(batches)} batches (budget {TOKEN_BUDGET} tokens, max {MAX_TERMS_PER_BATCH} terms)")
+
     processed_count = 0
-    i = 0
-    while i < len(data_list):
-        batch = []
-        minimum_size = 5
-        maximum_size = 12
-        # Add minimum n terms or until end
-        while len(batch) < minimum_size and i < len(data_list):
-            batch.append(data_list[i])
-            i += 1
-
-        # Extend if next is similar, up to maximum_size
-        while i < len(data_list) and len(batch) < maximum_size:
-            next_data = data_list[i]
-            last_term = batch[-1]["original_term"].lower()
-            next_term = next_data["original_term"].lower()
-            if next_term[:4] == last_term[:4] or next_term == last_term:
-                batch.append(next_data)
-                i += 1
-            else:
-                break
-        
-        if batch:
-            print(f"Processing batch of {len(batch)} terms (starting from term {processed_count + 1})...")
-            results = process_batch_with_llm(batch)
-            append_to_output_file(results, output_file)
-            processed_count += len(batch)
-            print(f"Processed {processed_count} terms so far...")
+    for batch in batches:
+        print(f"Processing batch of {len(batch)} terms (starting from term {processed_count + 1})...")
+        results = process_batch_with_llm(batch)
+        append_to_output_file(results, output_file)
+        processed_count += len(batch)
+        print(f"Processed {processed_count} terms so far...")
     
     print(f"Complete! Processed {processed_count} terms.")
     print(f"Results saved to {output_file}")
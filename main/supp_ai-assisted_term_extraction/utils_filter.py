@@ -0,0 +1,105 @@
+"""Post-filters for GLiNER candidates (used by 02_gliner_eog.py) and per-stage timing counters.
+
+The non-glycan exclusions are compiled into one alternation regex, so each candidate is scanned once
+instead of once per pattern; generic words are looked up in a set of normalized forms."""
+from contextlib import contextmanager
+import re
+import time
+
+MIN_TERM_LENGTH = 3
+
+# Exclude non-glycan entities (proteins, enzymes, antibodies, MS peak labels, metrics)
+NON_GLYCAN_PATTERNS = [
+    re.compile(r"\bMUC\d+\b", re.I),
+    re.compile(r"\bgalectin-?\d*\b", re.I),
+    re.compile(r"\blectins?\b", re.I),
+    re.compile(r"\bintegrins?\b", re.I),
+    re.compile(r"\balbumin\b", re.I),
+    re.compile(r"\btransferrin\b", re.I),
+
+    re.compile(r"\b(?:IgG|IgA|IgM)\b", re.I),
+    re.compile(r"\bantibod(?:y|ies)\b", re.I),
+    re.compile(r"\banti[-–\s]?glycans?\b", re.I),
+
+    re.compile(r"\b[a-zA-Zβ-]*transferases?\b", re.I),
+    re.compile(r"\b[a-zA-Zβ-]*glycosidas(?:e|es)\b", re.I),
+    re.compile(r"\bhexosaminidas(?:e|es)\b", re.I),
+    re.compile(r"\bmannosidas(?:e|es)\b", re.I),
+
+    re.compile(r"\b(?:GlycA|M2BPGi)\b", re.I),
+    re.compile(r"\bGP\d{1,3}\b", re.I),
+    
+    re.compile(r"\b(?:UDP|GDP|CMP)-[A-Za-z0-9]+(?:Kdn|Xyl|Fuc|Man|Gal|Glc|GlcA|GlcNAc|GalNAc|Neu5Ac|Neu5Gc)?\b", re.I),
+    re.compile(r"\b[αβ][1-9]-[1-9]\b"),
+    re.compile(r"\b[αβ][1-9]→[1-9]\b"),
+    re.compile(r"\bC[1-9]{2}:[1-9]\b"),
+    re.compile(r"\b(?:multivalent|vertebrate|bacterial|plant|fungal|nonreducing|cell surface|synthetic)(?:[-\w]*)\b", re.I),
+    re.compile(r"\b(?:[-\w]*?)linkage\b", re.I)
+]
+
+# Exclude overly-generic words
+GENERIC_BAD = {
+    "glycan", "glycans", "carbohydrate", "carbohydrates", "monosaccharide", "monosaccharides",
+    "disaccharide", "disaccharides", "trisaccharide", "trisaccharides", "oligosaccharide", "oligosaccharides",
+    "polysaccharide", "polysaccharides", "glycosylation", "glycosylations", "glycoform", "glycoforms",
+    "glycoconjugate", "glycoconjugates", "glycoprotein", "glycoproteins", "glycosidic bond", "glycosidic bonds",
+    "glycolipid", "glycolipids", "glycan structure", "glycan structures",
+    "glycan motif", "glycan motifs", "glycan epitope", "glycan epitopes",
+    
+    "n-glycan", "n-glycans", "n-linked glycan", "n-linked glycans", "n-glycan structure", "n-glycan structures",
+    "o-glycan", "o-glycans", "o-linked glycan", "o-linked glycans", "o-glycan structure", "o-glycan structures",
+    "gag", "gags", "glycosaminoglycan", "glycosaminoglycans",
+    "proteoglycan", "proteoglycans", "peptidoglycan", "peptidoglycans",
+    
+    "gt", "gts", "gh", "ghs", "sialidase", "sialidases", "neuraminidase", "neuraminidases",
+    "ogt", "ogts", "oga", "ogas",
+    
+    "dol-p-man", "mannac-6-p",
+}
+
+
+def normalize_term(term) -> str:
+    """Lowercase with runs of whitespace collapsed, the key used for GENERIC_BAD."""
+    return " ".join(term.lower().split())
+
+
+def compile_patterns(patterns):
+    """Joins patterns into a single alternation; case-insensitive patterns keep their flag as an inline group."""
+    return re.compile("|".join(f"(?i:{p.pattern})" if p.flags & re.I else f"(?:{p.pattern})" for p in patterns))
+
+
+NON_GLYCAN_RE = compile_patterns(NON_GLYCAN_PATTERNS)
+GENERIC_BAD_NORMALIZED = {normalize_term(term) for term in GENERIC_BAD}
+
+
+def is_excluded(term) -> bool:
+    """True for too-short terms, generic words and proteins/enzymes/antibodies/MS peaks/metrics."""
+    return (
+        len(term) < MIN_TERM_LENGTH
+        or normalize_term(term) in GENERIC_BAD_NORMALIZED
+        or NON_GLYCAN_RE.search(term) is not None
+    )
+
+
+class StageTimer:
+    """Accumulates wall-clock seconds and call counts per named stage."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def report(self) -> str:
+        total = sum(self.seconds.values()) or 1e-9
+        return "\n".join(
+            f"  {name:<12} {seconds:9.3f}s  {100 * seconds / total:5.1f}%  ({self.counts[name]} calls)"
+            for name, seconds in self.seconds.items()
+        )
@@ -0,0 +1,105 @@
+"""Batched, multi-process GLiNER inference for 02_gliner_eog.py.
+
+Each worker process loads its own model copy once and runs GLiNER's batch prediction API on batches of
+chunks; batches are returned in input order so the caller can write results in original line order.
+Raw predictions can be cached per (model, labels, prediction threshold, chunk text hash), so re-tuning
+the score threshold or the post-filters replays from disk instead of re-running inference."""
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import multiprocessing
+import sqlite3
+
+model = None # Per-process GLiNER model, set by init_model
+
+
+def init_model(model_name, threads=None) -> None:
+    """Loads the model in the current process; threads caps torch intra-op threads so workers do not oversubscribe cores."""
+    global model
+    from gliner import GLiNER
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    model = GLiNER.from_pretrained(model_name)
+
+
+def predict_batch(texts, labels, threshold) -> list:
+    """Returns one entry per text: (entities, None) or (None, error message).
+    If the batch call fails, the batch is retried text by text so one bad chunk does not drop its neighbours."""
+    try:
+        return [(entities, None) for entities in model.batch_predict_entities(texts, labels, threshold=threshold)]
+    except Exception:
+        results = []
+        for text in texts:
+            try:
+                results.append((model.predict_entities(text, labels, threshold=threshold), None))
+            except Exception as e:
+                results.append((None, str(e)))
+        return results
+
+
+def predict_batches(batches, model_name, labels, threshold, num_workers=1, threads_per_worker=None):
+    """Yields predict_batch results for each batch of texts, in input order.
+    With num_workers > 1 the batches are spread over worker processes, each holding its own model copy."""
+    if num_workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        init_model(model_name, threads_per_worker)
+        for texts in batches:
+            yield predict_batch(texts, labels, threshold)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=init_model,
+        initargs=(model_name, threads_per_worker),
+    ) as executor:
+        yield from executor.map(predict_batch, batches, [labels] * len(batches), [threshold] * len(batches))
+
+
+class PredictionCache:
+    """SQLite cache of raw GLiNER entities per chunk.
+    Entries are made with a low prediction threshold; with greedy flat decoding, keeping the cached spans
+    with score >= THRESHOLD gives the same spans as predicting with THRESHOLD directly."""
+
+    def __init__(self, cache_file, model_name, labels, threshold):
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self.version = json.dumps([model_name, labels, threshold])
+        self.connection = sqlite3.connect(cache_file)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, entities TEXT)")
+        self.connection.commit()
+        self.hits, self.misses = 0, 0
+
+    def key(self, text) -> str:
+        return hashlib.sha256(f"{self.version}\n{hashlib.sha256(text.encode('utf-8')).hexdigest()}".encode("utf-8")).hexdigest()
+
+    def get(self, text):
+        row = self.connection.execute("SELECT entities FROM predictions WHERE key = ?", (self.key(text),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, text, entities) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?)", (self.key(text), json.dumps(entities, ensure_ascii=False)))
+        self.connection.commit()
+
+
+def predict_texts(texts, model_name, labels, threshold, batch_size=8, num_workers=1, threads_per_worker=None, cache=None):
+    """Yields (entities, error) for each text, in input order.
+    Cached texts are served from the cache; only the rest are batched and sent to the model."""
+    cached = [cache.get(text) if cache is not None else None for text in texts]
+    missing = [text for text, entities in zip(texts, cached) if entities is None]
+    if cache is not None:
+        print(f"Prediction cache: {len(texts) - len(missing)} hits, {len(missing)} chunks to run")
+
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    predicted = (result for batch in predict_batches(batches, model_name, labels, threshold, num_workers, threads_per_worker) for result in batch) if batches else iter(())
+    for text, entities in zip(texts, cached):
+        if entities is not None:
+            yield entities, None
+            continue
+        entities, error = next(predicted)
+        if cache is not None and error is None:
+            cache.put(text, entities)
+        yield entities, error
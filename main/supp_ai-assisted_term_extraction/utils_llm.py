@@ -0,0 +1,100 @@
+"""Rate-limited concurrent LLM calls for the supplementary extraction scripts (03_filter_records.py).
+
+Requests go through token buckets for requests and tokens per minute, and are retried with exponential
+backoff on rate-limit (429), server (5xx) and connection errors."""
+import asyncio
+import json
+import random
+import re
+import time
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+FENCE_RE = re.compile(r"^```[\w+-]*\s*(.*?)\s*```", re.DOTALL) # ``` fence with any language tag (json, jsonl, ...)
+RETRYABLE_ERRORS = {"RateLimitError", "InternalServerError", "APIConnectionError", "APITimeoutError"}
+
+_encoding = None
+
+
+def estimate_tokens(text) -> int:
+    """Token count with tiktoken when installed (pip install tiktoken), otherwise ~4 characters per token."""
+    global _encoding
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return len(_encoding.encode(text))
+
+
+class TokenBucket:
+    """Allows up to per_minute units per minute, refilled continuously; waiters are served in arrival order."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount=1) -> None:
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Concurrency limit plus requests-per-minute and tokens-per-minute buckets."""
+
+    def __init__(self, max_concurrency, requests_per_minute, tokens_per_minute):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+
+def is_retryable(error) -> bool:
+    status_code = getattr(error, "status_code", None)
+    return type(error).__name__ in RETRYABLE_ERRORS or status_code == 429 or (status_code is not None and status_code >= 500)
+
+
+async def invoke_with_backoff(llm, messages, limiter, estimated_tokens, max_retries=6, base_delay=1.0):
+    """llm.ainvoke under the rate limiter; 429/5xx/connection errors are retried with exponential backoff and jitter."""
+    for attempt in range(max_retries + 1):
+        async with limiter.semaphore:
+            await limiter.requests.acquire()
+            await limiter.tokens.acquire(estimated_tokens)
+            try:
+                return await llm.ainvoke(messages)
+            except Exception as e:
+                if attempt == max_retries or not is_retryable(e):
+                    raise
+                delay = base_delay * 2 ** attempt + random.uniform(0, base_delay)
+                print(f"[WARN] {type(e).__name__}; retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+        await asyncio.sleep(delay)
+
+
+def parse_jsonl_response(response_text) -> list:
+    """Parses a model reply given as a JSON array or as JSONL lines, with or without a ``` fence.
+    Raises ValueError if any line is not valid JSON."""
+    response_text = response_text.strip()
+    fenced = FENCE_RE.match(response_text)
+    if fenced:
+        response_text = fenced.group(1)
+    try:
+        results = json.loads(response_text)
+        return results if isinstance(results, list) else [results]
+    except json.JSONDecodeError:
+        pass
+    try:
+        return [json.loads(line) for line in response_text.splitlines() if line.strip()]
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Malformed response: {e}") from e
@@ -0,0 +1,179 @@
+"""Aho–Corasick dictionary tagger for known GSD surface forms (labels, source labels, exact and related synonyms).
+
+Uses the C implementation from `pyahocorasick` when installed (pip install pyahocorasick) and falls back to a
+pure-Python automaton otherwise. Matching is case-insensitive, restricted to token boundaries, and resolved
+leftmost-longest so overlapping surface forms yield one span.
+"""
+from bisect import bisect_right
+from collections import deque
+import re
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+SENT_END = re.compile(r"(?<=\.)\s+")
+MIN_SURFACE_FORM_LENGTH = 3
+
+
+class PyAutomaton:
+    """Minimal Aho–Corasick automaton with the subset of the pyahocorasick API used here."""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]
+        self.dict_suffix = [0]
+
+    def add_word(self, key, value) -> None:
+        state = 0
+        for char in key:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+                self.dict_suffix.append(0)
+            state = next_state
+        self.output[state] = value
+
+    def make_automaton(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                fail_state = self.fail[state]
+                while fail_state and char not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(char, 0)
+                # Nearest proper suffix state that ends a word
+                suffix = self.fail[next_state]
+                self.dict_suffix[next_state] = suffix if self.output[suffix] is not None else self.dict_suffix[suffix]
+                queue.append(next_state)
+
+    def iter(self, text):
+        """Yields (end_index, value) for every word occurrence, like pyahocorasick.Automaton.iter."""
+        goto, fail, output, dict_suffix = self.goto, self.fail, self.output, self.dict_suffix
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                yield index, output[state]
+            suffix = dict_suffix[state]
+            while suffix:
+                yield index, output[suffix]
+                suffix = dict_suffix[suffix]
+
+
+def iter_surface_forms(node):
+    """Yields (surface_form, match_type) for a dictionary node."""
+    yield node.get("lbl"), "lbl"
+    for source in node.get("sources", []):
+        src_content = source.get("src_content") or {}
+        yield source.get("src_lbl"), "src_lbl"
+        for synonym in src_content.get("exact_synonyms") or []:
+            yield synonym, "exact_synonym"
+        for synonym in src_content.get("related_synonyms") or []:
+            yield synonym, "related_synonym"
+
+
+def build_automaton(nodes):
+    """Compiles all surface forms of the dictionary nodes into one automaton.
+    Each key maps to (surface_form, {term_uuid: match_type}); the strongest match type wins per term_uuid."""
+    rank = {"lbl": 0, "src_lbl": 1, "exact_synonym": 2, "related_synonym": 3}
+    surface_forms = {}
+    for node in nodes:
+        term_uuid = node.get("term_uuid")
+        for surface_form, match_type in iter_surface_forms(node):
+            if not surface_form or len(surface_form.strip()) < MIN_SURFACE_FORM_LENGTH:
+                continue
+            key = surface_form.strip().lower()
+            _, term_uuids = surface_forms.setdefault(key, (surface_form.strip(), {}))
+            if term_uuid not in term_uuids or rank[match_type] < rank[term_uuids[term_uuid]]:
+                term_uuids[term_uuid] = match_type
+
+    automaton = ahocorasick.Automaton() if ahocorasick is not None else PyAutomaton()
+    for key, (surface_form, term_uuids) in surface_forms.items():
+        automaton.add_word(key, (len(key), surface_form, term_uuids))
+    automaton.make_automaton()
+    print(f"Compiled {len(surface_forms)} surface forms into {'pyahocorasick' if ahocorasick is not None else 'pure-Python'} automaton")
+    return automaton
+
+
+def is_boundary(text, index) -> bool:
+    return index < 0 or index >= len(text) or not text[index].isalnum()
+
+
+def find_matches(automaton, text) -> list:
+    """Returns leftmost-longest, non-overlapping matches as (start, end, surface_form, {term_uuid: match_type})."""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # Case folding changed offsets (rare characters); match case-sensitively to keep positions exact
+        lowered = text
+    candidates = []
+    for end_index, (length, surface_form, term_uuids) in automaton.iter(lowered):
+        start = end_index - length + 1
+        if is_boundary(lowered, start - 1) and is_boundary(lowered, end_index + 1):
+            candidates.append((start, end_index + 1, surface_form, term_uuids))
+
+    candidates.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+    matches = []
+    last_end = 0
+    for match in candidates:
+        if match[0] >= last_end:
+            matches.append(match)
+            last_end = match[1]
+    return matches
+
+
+def sentence_spans(text) -> list:
+    """Period-to-period sentence spans, same split as 02_gliner_eog.py."""
+    spans = []
+    start_idx = 0
+    for m in SENT_END.finditer(text):
+        spans.append((start_idx, m.start() + 1))
+        start_idx = m.end()
+    if start_idx < len(text):
+        spans.append((start_idx, len(text)))
+    return spans
+
+
+def enclosing_sentence(text, spans, span_starts, start, end) -> str:
+    """Finds the sentence containing [start, end) with bisect over the sorted sentence starts.
+    Same result as the first span overlapping the entity in a linear scan, as 02_gliner_eog.py used to do."""
+    index = bisect_right(span_starts, start) - 1
+    if index >= 0:
+        s, e = spans[index]
+        if s <= start < e:
+            return text[s:e].strip()
+    # Starts in the gap between two sentences: the next sentence, if the span reaches into it
+    if index + 1 < len(spans) and end > spans[index + 1][0]:
+        s, e = spans[index + 1]
+        return text[s:e].strip()
+    lo = max(0, start - 120)
+    hi = min(len(text), end + 120)
+    return text[lo:hi].strip()
+
+
+def tag_text(automaton, text) -> list:
+    """Tags one text and returns records in the shape of eog_raw_terms.jsonl (without metadata)."""
+    spans = sentence_spans(text)
+    span_starts = [s for s, _ in spans]
+    records = []
+    for start, end, surface_form, term_uuids in find_matches(automaton, text):
+        records.append({
+            "term": text[start:end],
+            "start_pos": start,
+            "end_pos": end,
+            "similarity": 1.0,
+            "term_in_sentence": enclosing_sentence(text, spans, span_starts, start, end),
+            "matched_surface_form": surface_form,
+            "term_uuid": sorted(term_uuids),
+            "match_type": sorted(set(term_uuids.values())),
+        })
+    return records
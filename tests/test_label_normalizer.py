@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "main" / "3_utils"))
+from util_label_normalizer import normalize_label
+
+
+def test_spelled_out_greek_inside_linkage_tokens():
+    assert normalize_label("Galalpha1-3Gal") == normalize_label("Galα1-3Gal")
+    assert normalize_label("Galbeta1-4GlcNAc") == normalize_label("Galβ1-4GlcNAc")
+
+
+def test_spelled_out_greek_as_separate_token():
+    assert normalize_label("GD1 alpha") == normalize_label("GD1a")
+    assert normalize_label("alpha-Gal") == normalize_label("α-Gal")
+
+
+def test_greek_names_are_not_folded_inside_words():
+    assert normalize_label("betaine") == "betaine"
+    assert normalize_label("betaine") != normalize_label("bine")
+
+
+def test_linkage_commas_and_hyphens_are_equivalent():
+    assert normalize_label("Fucα1-2Gal") == normalize_label("Fuc-alpha-1,2-Gal")
+    assert normalize_label("α2,6-sialyl") == normalize_label("α2-6-sialyl")
@@ -0,0 +1,100 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "main" / "1_ai-assisted_term_matching"))
+from mapping_utils import LexicalIndex, OrderedDecisionWriter, SynonymBuffer, current_line, load_checkpoint
+
+
+class DictVectorStore:
+    """Minimal in-memory stand-in for the get/add_documents surface SynonymBuffer uses."""
+
+    def __init__(self, documents):
+        self.documents = dict(documents)
+
+    def get(self, ids=None, include=None):
+        ids = [doc_id for doc_id in ids if doc_id in self.documents]
+        return {"ids": ids, "documents": [self.documents[doc_id] for doc_id in ids], "metadatas": [{} for _ in ids]}
+
+    def add_documents(self, documents, ids):
+        for doc_id, doc in zip(ids, documents):
+            self.documents[doc_id] = doc.page_content
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.documents.pop(doc_id, None)
+
+
+def make_doc(term, term_uuid):
+    return f"Term: {term}\nExact Synonyms: []\nDescription: \nTerm UUID: {term_uuid}"
+
+
+def test_resume_after_mapped_document_was_removed(tmp_path):
+    journal_file, output_file = tmp_path / "checkpoint.jsonl", tmp_path / "decisions.jsonl"
+    vector_store = DictVectorStore({"u1": make_doc("Lewis a", "u1"), "u2": make_doc("Lewis b", "u2")})
+    writer = OrderedDecisionWriter(output_file, tmp_path / "log.txt", journal_file)
+    synonym_buffer = SynonymBuffer(vector_store, flush_size=100, writer=writer)
+
+    # Line 1 maps to u1, its update is flushed and the line completes
+    writer.expect(1)
+    current_line.set(1)
+    synonym_buffer.add("u1", "Le a")
+    writer.record_mutation("update", "Le a", "u1")
+    synonym_buffer.flush()
+    writer.complete(1, "")
+
+    # Line 2 maps to u2 but the run stops before the update is flushed
+    writer.expect(2)
+    current_line.set(2)
+    synonym_buffer.add("u2", "Le b")
+    writer.record_mutation("update", "Le b", "u2")
+
+    # Both documents are removed before the resume, e.g. by a vector store sync
+    vector_store.delete(["u1", "u2"])
+
+    completed_lines, decided_terms, recovered_adds, journaled_updates = load_checkpoint(journal_file, output_file)
+    assert completed_lines == {1}
+    assert journaled_updates == [("Le b", "u2")]
+
+    resumed_buffer = SynonymBuffer(vector_store, writer=writer)
+    resumed_buffer.replay(journaled_updates) # Must not raise for the missing document
+    assert vector_store.documents == {}
+
+
+def test_unflushed_updates_of_completed_lines_are_replayed(tmp_path):
+    journal_file, output_file = tmp_path / "checkpoint.jsonl", tmp_path / "decisions.jsonl"
+    events = [
+        {"event": "mutation", "line": 1, "op": "update", "term": "Le a", "id": "u1"},
+        {"event": "flush"},
+        {"event": "done", "line": 1, "decisions": []},
+        {"event": "mutation", "line": 2, "op": "update", "term": "Le b", "id": "u2"},
+        {"event": "done", "line": 2, "decisions": []},
+    ]
+    journal_file.write_text("".join(json.dumps(event) + "\n" for event in events))
+
+    _, _, _, journaled_updates = load_checkpoint(journal_file, output_file)
+    assert journaled_updates == [("Le b", "u2")]
+
+
+def test_lexical_index_maps_only_exact_or_separator_variants():
+    lexical_index = LexicalIndex()
+    lexical_index.add("I antigen", "u1", "Term")
+    lexical_index.add("Lewis a", "u2", "Term")
+    lexical_index.add("Galβ1-3GlcNAc", "u3", "Exact Synonyms")
+
+    assert lexical_index.match("I antigen")[0] == "u1"
+    assert lexical_index.match("Lewis-a")[0] == "u2"
+    assert lexical_index.match("Galβ1,3GlcNAc")[0] == "u3"
+    # Case and Greek-spelling variants share a normalized key but may be distinct concepts
+    assert lexical_index.match("i antigen") is None
+    assert lexical_index.match("Galbeta1-3GlcNAc") is None
+
+
+def test_lexical_index_sends_ambiguous_matches_to_the_llm():
+    lexical_index = LexicalIndex()
+    lexical_index.add("I antigen", "u1", "Term")
+    lexical_index.add("i antigen", "u2", "Term")
+    lexical_index.add("I-antigen", "u3", "Exact Synonyms")
+
+    assert lexical_index.match("I antigen")[0] == "u1"
+    assert lexical_index.match("I_antigen") is None
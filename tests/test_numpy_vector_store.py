@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parents[1] / "main" / "1_ai-assisted_term_matching"))
+from numpy_vector_store import NumpyVectorStore
+
+
+class LetterEmbeddings:
+    """Deterministic stand-in for an embedding model: counts of the letters a-h."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(text.count(letter)) + 0.1 for letter in "abcdefgh"]
+
+
+def open_store(directory):
+    return NumpyVectorStore(collection_name="test", embedding_function=LetterEmbeddings(), persist_directory=directory)
+
+
+def test_upserts_are_written_in_place_and_survive_reload(tmp_path):
+    vector_store = open_store(tmp_path)
+    vector_store.add_texts(["aaa", "bbb"], [{"n": 1}, {"n": 2}], ids=["a", "b"])
+    matrix_file = tmp_path / "test.npy"
+    inode = matrix_file.stat().st_ino
+
+    # Overwrite "a", append "c", and append "d" twice in the same call (the last text wins)
+    vector_store.add_texts(["ccc", "ddd", "hhh", "ggg"], [{"n": 3}, {"n": 4}, {}, {"n": 5}], ids=["a", "c", "d", "d"])
+    assert matrix_file.stat().st_ino == inode
+    assert isinstance(vector_store.matrix, np.memmap)
+
+    reloaded = open_store(tmp_path)
+    assert reloaded.ids == ["a", "b", "c", "d"]
+    assert reloaded.documents == ["ccc", "bbb", "ddd", "ggg"]
+    assert reloaded.metadatas == [{"n": 3}, {"n": 2}, {"n": 4}, {"n": 5}]
+    assert np.allclose(reloaded.matrix, vector_store.matrix)
+    assert [doc.id for doc in reloaded.similarity_search("gggg", k=2)][0] == "d"
+    assert [doc.id for doc in reloaded.similarity_search("cccc", k=1)] == ["a"]
+
+
+def test_interrupted_append_is_ignored_on_reload(tmp_path):
+    vector_store = open_store(tmp_path)
+    vector_store.add_texts(["aaa", "bbb"], ids=["a", "b"])
+    sidecar = (tmp_path / "test.json").read_bytes()
+    vector_store.add_texts(["ccc"], ids=["c"])
+    # The matrix was extended but the run stopped before the sidecar was replaced
+    (tmp_path / "test.json").write_bytes(sidecar)
+
+    reloaded = open_store(tmp_path)
+    assert reloaded.ids == ["a", "b"] and reloaded.matrix.shape[0] == 2
+    reloaded.add_texts(["eee"], ids=["e"])
+    assert open_store(tmp_path).matrix.shape == (3, 8)
+    assert [doc.id for doc in open_store(tmp_path).similarity_search("eeee", k=1)] == ["e"]